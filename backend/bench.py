@@ -0,0 +1,400 @@
+"""Micro-benchmarks for the Word Psychic backend.
+
+Run from ``backend/``::
+
+    python bench.py deck
+    python bench.py dispatch
+    python bench.py eventlog -n 1000000
+    python bench.py journal -n 1000000
+    python bench.py load --url http://127.0.0.1:8000 --clients 1000
+    python bench.py metrics
+    python bench.py parse
+    python bench.py replies
+    python bench.py rng
+    python bench.py sessions
+    python bench.py tokens
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import engine
+from eventlog import TransitionLog, log_files
+from sessions import EventSourcedSessionStore, JournaledSessionStore, Session, SessionTokens
+
+def _bytes_per(make: Callable[[int], Any], n: int) -> float:
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    keep = [make(i) for i in range(n)]
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del keep
+    return used / n
+
+# ---------- sessions ----------
+def _legacy_session(i: int) -> Dict[str, Any]:
+    """The pre-``Session`` dict layout, after a couple of offers."""
+    idxs = list(range(len(engine.ACTIVE.clusters)))
+    random.shuffle(idxs)
+    rejected = [idxs.pop()]
+    revealed = [engine.ACTIVE.clusters.title(idxs.pop())]
+    return {
+        "sid": None,
+        "INSTRUCTION_SHOWN": False,
+        "SHORT_HINT_SHOWN": False,
+        "remaining": idxs,
+        "rejected": rejected,
+        "words_revealed": revealed,
+        "first_offer_done": True,
+        "reoffer_attempts": 0,
+        "phase": "post_reveal",
+        "current_idx": 0,
+    }
+
+# Offer, decline, offer, reveal: the last reply is a full script.
+_ANSWERS = ("yes", "no", "yes", "yes")
+
+def _answer(st: Session, seq: int, answer: str) -> engine.Reply:
+    """Answer like ``/choose`` does, remembering the numbered answer."""
+    before = st.to_bytes(with_reply=False)
+    out = engine.advance(st, answer)
+    st.remember_reply(seq, engine.ANSWER_CLASSES.get(answer, engine.OTHER), before)
+    return out
+
+def _compact_session(i: int) -> Session:
+    st = engine.new_session()
+    for seq, answer in enumerate(_ANSWERS, 1):
+        _answer(st, seq, answer)
+    return st
+
+def _event_session(i: int) -> bytes:
+    """The same session as ``_compact_session`` as the events store keeps it."""
+    st = engine.new_session(history=True)
+    for seq, answer in enumerate(_ANSWERS, 1):
+        _answer(st, seq, answer)
+    return EventSourcedSessionStore.EVENTS + st.events()
+
+def _reply_text(i: int) -> str:
+    """What caching the last reply as text added on top of the session."""
+    st = engine.new_session()
+    return [_answer(st, seq, answer) for seq, answer in enumerate(_ANSWERS, 1)][-1].text
+
+def bench_sessions(args: argparse.Namespace) -> None:
+    n = args.n
+    before = _bytes_per(_legacy_session, n)
+    after = _bytes_per(_compact_session, n)
+    events = _bytes_per(_event_session, n)
+    text = _bytes_per(_reply_text, n)
+    st = _compact_session(0)
+    repeat = timeit.timeit(lambda: engine.repeat_reply(st), number=max(n // 10, 1)) / max(n // 10, 1)
+    print(f"clusters:          {len(engine.ACTIVE.clusters)}")
+    print(f"dict session:      {before:8.1f} bytes")
+    print(f"Session:           {after:8.1f} bytes (last answer kept as state)")
+    print(f"  reply as text:   {text:8.1f} bytes more")
+    print(f"  repeat a reply:  {repeat * 1e6:8.2f} us")
+    print(f"event log:         {events:8.1f} bytes")
+    print(f"1M sessions:       {before * 1e6 / 2**20:8.1f} MiB -> {after * 1e6 / 2**20:.1f} MiB"
+          f" -> {events * 1e6 / 2**20:.1f} MiB")
+    loops = max(n // 10, 1)
+    for answers in (4, 20):
+        st = engine.new_session(history=True)
+        for k in range(answers):
+            engine.advance(st, "yes" if k % 4 else "maybe")
+        log = st.events()
+        took = timeit.timeit(lambda: engine.replay(None, log), number=loops) / loops
+        print(f"replay {answers:2d} answers: {took * 1e6:8.2f} us")
+
+# ---------- tokens ----------
+def bench_tokens(args: argparse.Namespace) -> None:
+    tokens = SessionTokens(b"bench-secret")
+    st = _compact_session(0)
+    token = tokens.encode(st)
+    loops = max(args.n // 10, 1)
+    enc = timeit.timeit(lambda: tokens.encode(st), number=loops) / loops
+    dec = timeit.timeit(lambda: tokens.decode(token), number=loops) / loops
+    print(f"record:            {len(st.to_bytes())} bytes")
+    print(f"token:             {len(token)} chars")
+    print(f"encode:            {enc * 1e6:8.2f} us")
+    print(f"decode:            {dec * 1e6:8.2f} us")
+
+# ---------- deck ----------
+def _synthetic_pack(path: str, size: int) -> int:
+    """Write a ``size``-cluster pack built from variants of the real deck;
+    returns the total script bytes."""
+    base = engine.ACTIVE
+    clusters, raw = [], 0
+    for i in range(size):
+        src = base.clusters[i % len(base.clusters)]
+        words = [f"{w}{i}" for w in src.words]
+        script = src.script.replace(src.head, words[0])
+        clusters.append({"title": " → ".join(words), "script": script})
+        raw += sys.getsizeof(script)
+    source = {"version": 1, "pools": dict(base.pools), "lines": dict(base.lines), "clusters": clusters}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(source, f)
+    return raw
+
+def bench_deck(args: argparse.Namespace) -> None:
+    """Pack size, heap growth and reveal latency for large synthetic decks."""
+    from content import open_pack
+
+    reveals = min(args.n, 20_000)
+    rng = random.Random(7)
+    print(f"{'clusters':>9} {'pack':>9} {'scripts':>9} {'heap':>9} {'cold':>9} {'hot':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (1_000, 10_000, 100_000):
+            src = os.path.join(tmp, f"deck{size}.json")
+            raw = _synthetic_pack(src, size)
+            tracemalloc.start()
+            pack = open_pack(src)
+            clusters = pack.clusters
+            picks = [rng.randrange(size) for _ in range(reveals)]
+            t0 = time.perf_counter()
+            for idx in picks:
+                clusters.script(idx)
+            cold = (time.perf_counter() - t0) / reveals
+            heap = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            hot_idx = picks[-1]
+            hot = timeit.timeit(lambda: clusters.script(hot_idx), number=reveals) / reveals
+            wpk = os.path.getsize(src[:-len(".json")] + ".wpk")
+            print(
+                f"{size:>9} {wpk / 2**20:>7.1f}Mi {raw / 2**20:>7.1f}Mi {heap / 2**20:>7.1f}Mi "
+                f"{cold * 1e6:>7.1f}us {hot * 1e6:>7.2f}us"
+            )
+    print(f"heap: Python allocations after opening the pack and {reveals} random reveals")
+    print("scripts: what keeping every script resident as str would cost")
+
+# ---------- journal ----------
+def bench_journal(args: argparse.Namespace) -> None:
+    """Write ``-n`` sessions three times each through the journal, then time
+    recovery from the raw journal and from a snapshot."""
+    n = args.n
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JournaledSessionStore(tmp, max_sessions=n, snapshot_every=n * 10)
+        sessions = [engine.new_session(f"{i:036d}") for i in range(n)]
+        t0 = time.perf_counter()
+        for answer in ("yes", "yes", "no"):
+            for st in sessions:
+                engine.advance(st, answer)
+                store.put(st.sid, st)
+        put = (time.perf_counter() - t0) / (3 * n)
+        store.close()
+        logical, journal = store.logical_bytes, store.written_bytes
+        del sessions, store
+
+        replay = JournaledSessionStore(tmp, max_sessions=n)
+        replay_s = replay.recovery_seconds
+        replay.snapshot()
+        replay.close()
+        snapshot = replay.written_bytes
+        del replay
+
+        loaded = JournaledSessionStore(tmp, max_sessions=n)
+        print(f"sessions:          {loaded.recovered}")
+        print(f"put:               {put * 1e6:8.2f} us")
+        print(f"session records:   {logical / 2**20:8.1f} MiB")
+        print(f"journal:           {journal / 2**20:8.1f} MiB ({journal / logical:.2f}x)")
+        print(f"snapshot:          {snapshot / 2**20:8.1f} MiB")
+        print(f"with one snapshot: {(journal + snapshot) / logical:8.2f}x write amplification")
+        print(f"recover (journal): {replay_s:8.2f} s")
+        print(f"recover (snapshot):{loaded.recovery_seconds:8.2f} s")
+        loaded.close()
+
+# ---------- eventlog ----------
+def bench_eventlog(args: argparse.Namespace) -> None:
+    """Request-path cost of logging ``-n`` transitions and how fast the
+    writer drains them to disk."""
+    n = args.n
+    sessions = [engine.new_session(f"{i:036d}") for i in range(1000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        log = TransitionLog(tmp, max_pending=n)
+        t0 = time.perf_counter()
+        for i in range(n):
+            log.record(sessions[i % 1000].log_key(), 2, 1, 3, 0, i % 500)
+        queued = time.perf_counter() - t0
+        log.close()
+        drained = time.perf_counter() - t0
+        size = sum(os.path.getsize(name) for name in log_files(tmp))
+        print(f"record:            {queued / n * 1e6:8.2f} us")
+        print(f"written:           {log.written} ({log.dropped} dropped)")
+        print(f"throughput:        {n / drained:8.0f} transitions/s")
+        print(f"log size:          {size / n:8.1f} bytes/transition")
+
+# ---------- rng ----------
+def bench_rng(args: argparse.Namespace) -> None:
+    """Per-session generator vs the shared ``random`` module."""
+    pool = engine.ACTIVE.pools["invalid_yne"]
+    st = engine.new_session(seed=7)
+    n = args.n
+    shared = timeit.timeit(lambda: random.choice(pool), number=n) / n
+    own = timeit.timeit(lambda: st.choice(pool), number=n) / n
+    shared_p = timeit.timeit(lambda: random.random() < 0.35, number=n) / n
+    own_p = timeit.timeit(lambda: st.randbelow(20) < 7, number=n) / n
+    print(f"random.choice:     {shared * 1e9:8.1f} ns")
+    print(f"Session.choice:    {own * 1e9:8.1f} ns")
+    print(f"random.random:     {shared_p * 1e9:8.1f} ns")
+    print(f"Session.randbelow: {own_p * 1e9:8.1f} ns")
+
+    draws = 200_000
+    counts = [0] * len(pool)
+    for _ in range(draws):
+        counts[st.randbelow(len(pool))] += 1
+    spread = (max(counts) - min(counts)) / (draws / len(pool))
+    print(f"variant spread:    {spread * 100:8.2f} % over {draws} draws")
+
+# ---------- metrics ----------
+def bench_metrics(args: argparse.Namespace) -> None:
+    """Cost of counting, alone and from several threads at once."""
+    import threading
+    from metrics import Metrics
+
+    m = Metrics()
+    labels = (("phase", "intro"), ("answer", "yes"))
+    n = args.n
+    inc = timeit.timeit(lambda: m.inc("c", labels), number=n) / n
+    obs = timeit.timeit(lambda: m.observe("h", labels, 0.00003), number=n) / n
+    print(f"inc:               {inc * 1e9:8.1f} ns")
+    print(f"observe:           {obs * 1e9:8.1f} ns")
+
+    for threads in (1, 4, 8):
+        per = n // threads
+
+        def work() -> None:
+            for _ in range(per):
+                m.observe("h", labels, 0.00003)
+
+        pool = [threading.Thread(target=work) for _ in range(threads)]
+        t0 = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        took = time.perf_counter() - t0
+        print(f"observe x{threads} threads: {took / (per * threads) * 1e9:6.1f} ns/op")
+    t0 = time.perf_counter()
+    text = m.render()
+    print(f"render:            {(time.perf_counter() - t0) * 1e6:8.1f} us ({len(text)} bytes)")
+
+# ---------- dispatch ----------
+def bench_dispatch(args: argparse.Namespace) -> None:
+    """Time ``advance`` against the old if-chain over a fixed mix of answers,
+    sessions restarted as they end."""
+    from tests.test_engine import legacy_advance
+
+    rng = random.Random(7)
+    answers = [engine.normalize(rng.choice(["yes", "yes", "no", "maybe", "end"])) for _ in range(args.n)]
+
+    def run(step: Callable[[Session, str], engine.Reply]) -> float:
+        seeds = iter(range(len(answers) + 1))
+        st = engine.new_session(seed=next(seeds))
+        start = timeit.default_timer()
+        for a in answers:
+            if step(st, a).done:
+                st = engine.new_session(seed=next(seeds))
+        return (timeit.default_timer() - start) / len(answers)
+
+    legacy, table = run(legacy_advance), run(engine.advance)
+    print(f"transitions:       {len(answers)}")
+    print(f"if-chain:          {legacy * 1e6:8.2f} us")
+    print(f"advance:           {table * 1e6:8.2f} us ({legacy / table:.2f}x)")
+
+# ---------- parse ----------
+def bench_parse(args: argparse.Namespace) -> None:
+    import app  # needs fastapi/pydantic
+
+    body = json.dumps({"answer": "yes", "seq": 3, "context": {"session_id": "0" * 36}}).encode()
+    loops = max(args.n // 10, 1)
+    model = timeit.timeit(lambda: app.YesNoRequest.model_validate(json.loads(body)), number=loops) / loops
+    fast = timeit.timeit(lambda: app.parse_choose_body(body, "application/json"), number=loops) / loops
+    print(f"YesNoRequest:      {model * 1e6:8.2f} us")
+    print(f"parse_choose_body: {fast * 1e6:8.2f} us")
+
+# ---------- replies ----------
+def bench_replies(args: argparse.Namespace) -> None:
+    from fastapi.responses import JSONResponse
+    import app  # needs fastapi
+
+    out = engine.Reply(engine.ACTIVE.pools["invalid_yne"][0])
+    sid = "0" * 36
+    loops = max(args.n // 10, 1)
+    encoded = timeit.timeit(
+        lambda: JSONResponse({"text": out.text, "done": out.done, "context": {"session_id": sid}}),
+        number=loops,
+    ) / loops
+    raw = timeit.timeit(lambda: app.reply_response(out, sid), number=loops) / loops
+    print(f"JSONResponse:      {encoded * 1e6:8.2f} us")
+    print(f"reply_response:    {raw * 1e6:8.2f} us")
+
+# ---------- load ----------
+async def _load(url: str, clients: int, rounds: int) -> List[float]:
+    import httpx  # bench-only dependency
+
+    latencies: List[float] = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as http:
+        async def timed(method: str, path: str, **kw: Any) -> Dict[str, Any]:
+            t0 = time.perf_counter()
+            res = await http.request(method, path, **kw)
+            latencies.append(time.perf_counter() - t0)
+            return res.json()
+
+        async def client() -> None:
+            sid = (await timed("GET", "/start"))["session_id"]
+            for _ in range(rounds):
+                out = await timed("POST", "/choose", json={"answer": "yes", "context": {"session_id": sid}})
+                if out["done"]:
+                    sid = (await timed("GET", "/start"))["session_id"]
+
+        await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+def bench_load(args: argparse.Namespace) -> None:
+    """Hammer a running server, e.g. ``uvicorn app:app`` with and without
+    ``WP_ASYNC_HANDLERS=0``, from ``--clients`` concurrent sessions. All of
+    them come from one address, so leave the per-client limits off
+    (``WP_RATE`` and ``WP_SESSIONS_PER_CLIENT`` unset)."""
+    rounds = max(args.n // args.clients, 1)
+    t0 = time.perf_counter()
+    latencies = sorted(asyncio.run(_load(args.url, args.clients, rounds)))
+    elapsed = time.perf_counter() - t0
+    print(f"requests:          {len(latencies)} from {args.clients} clients")
+    print(f"throughput:        {len(latencies) / elapsed:8.0f} req/s")
+    print(f"p50:               {latencies[len(latencies) // 2] * 1e3:8.1f} ms")
+    print(f"p99:               {latencies[int(len(latencies) * 0.99)] * 1e3:8.1f} ms")
+
+BENCHES: Dict[str, Callable[[argparse.Namespace], None]] = {
+    "deck": bench_deck,
+    "dispatch": bench_dispatch,
+    "eventlog": bench_eventlog,
+    "journal": bench_journal,
+    "load": bench_load,
+    "metrics": bench_metrics,
+    "parse": bench_parse,
+    "replies": bench_replies,
+    "rng": bench_rng,
+    "sessions": bench_sessions,
+    "tokens": bench_tokens,
+}
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("bench", choices=sorted(BENCHES))
+    parser.add_argument("-n", type=int, default=100_000)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=1000)
+    args = parser.parse_args(argv)
+    BENCHES[args.bench](args)
+
+if __name__ == "__main__":
+    main()
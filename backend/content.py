@@ -0,0 +1,294 @@
+"""Word Psychic content packs.
+
+A pack is authored as JSON (``content_pack.json``): a ``version`` number,
+fixed reply ``lines``, the prompt ``pools`` and the word ``clusters``. It is
+compiled to a compact binary file that is memory-mapped at startup, and
+strings are only decoded when something asks for them. Cluster scripts,
+the bulk of a large deck, are zlib-compressed one by one and inflated on
+reveal through a small LRU (``WP_SCRIPT_CACHE`` entries per pack).
+
+Binary layout (little-endian)::
+
+    header   magic "WPCK", format u16, reserved u16, pack version u32,
+             string/pool/line/cluster counts u32 x4
+    strings  (offset u32, length u32) per string, into the blob
+    pools    name id u32, count u32, then count string ids u32
+    lines    (name id u32, value id u32) per line
+    clusters (title, intro_line, continue_q) string ids u32 x3, then the
+             compressed script's blob offset u32 and length u32
+    blob     UTF-8 string data, then the compressed scripts
+
+Run ``python content.py content_pack.json content_pack.wpk`` to compile.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import functools
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+MAGIC = b"WPCK"
+FORMAT = 2
+_HEADER = struct.Struct("<4sHHIIIII")
+_CLUSTER_FIELDS = ("title", "intro_line", "continue_q")
+_CLUSTER = struct.Struct("<" + "I" * (len(_CLUSTER_FIELDS) + 2))
+
+SCRIPT_CACHE = int(os.environ.get("WP_SCRIPT_CACHE", "1024"))
+
+# ---------- Compiled clusters ----------
+class Cluster(NamedTuple):
+    title: str
+    head: str
+    words: Tuple[str, str, str]
+    definitions: Tuple[str, str, str]
+    examples: Tuple[str, str, str]
+    fortune: str
+    intro_line: str
+    new_word_line: str
+    continue_q: str
+    script: str
+
+class Offer(NamedTuple):
+    """What offering a word needs; derived from the title, never the script."""
+    intro_line: str
+    new_word_line: str
+    continue_q: str
+
+def make_offer(title: str, intro_line: str = "", continue_q: str = "") -> Offer:
+    head = title.split(" → ", 1)[0].strip()
+    return Offer(
+        intro_line=intro_line or f"Your word is “{head.lower()}.”\n\n",
+        new_word_line=f"Your new word is “{head}.”\n\n",
+        continue_q=continue_q.strip(),
+    )
+
+def compile_cluster(src: Dict[str, str]) -> Cluster:
+    """Parse one cluster source into a ``Cluster``.
+
+    Scripts are four paragraphs: "<Word> means <definition>" plus an
+    example, two "<lead>. <Word> — <definition>" paragraphs with examples,
+    then the word roll call and "Your fortune: ..." line.
+    """
+    title, script = src["title"], src["script"]
+    words = tuple(w.strip() for w in title.split(" → "))
+    paras = script.split("\n\n")
+    if len(words) != 3 or len(paras) != 4:
+        raise ValueError(f"cluster {title!r}: expected 3 words and 4 paragraphs")
+
+    definitions, examples = [], []
+    for n, para in enumerate(paras[:3]):
+        first, _, example = para.partition("\n")
+        if n == 0:
+            _, _, definition = first.partition(" means ")
+        else:
+            _, _, definition = first.partition(" — ")
+        if not definition or not example:
+            raise ValueError(f"cluster {title!r}: cannot parse paragraph {n + 1}")
+        definitions.append(definition.strip())
+        examples.append(example.strip())
+
+    fortune = paras[3].rpartition("Your fortune: ")[2].strip()
+    offer = make_offer(title, src.get("intro_line") or "", src.get("continue_q") or "")
+    return Cluster(
+        title=title,
+        head=words[0],
+        words=words,
+        definitions=tuple(definitions),
+        examples=tuple(examples),
+        fortune=fortune,
+        intro_line=offer.intro_line,
+        new_word_line=offer.new_word_line,
+        continue_q=offer.continue_q,
+        script=script,
+    )
+
+# ---------- Compiling ----------
+def compile_pack(source: Dict[str, Any]) -> bytes:
+    """Serialize a JSON pack source into the binary pack format."""
+    version = int(source["version"])
+    if not 0 < version <= 0xFFFF:
+        raise ValueError(f"pack version must be 1..65535, got {version}")
+    clusters = source["clusters"]
+    for src in clusters:
+        compile_cluster(src)  # fail the build, not a live session
+
+    strings: List[bytes] = []
+    ids: Dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        sid = ids.get(text)
+        if sid is None:
+            sid = ids[text] = len(strings)
+            strings.append(text.encode("utf-8"))
+        return sid
+
+    pools = b"".join(
+        struct.pack(f"<II{len(items)}I", intern(name), len(items), *(intern(t) for t in items))
+        for name, items in source.get("pools", {}).items()
+    )
+    lines = b"".join(
+        struct.pack("<II", intern(name), intern(text)) for name, text in source.get("lines", {}).items()
+    )
+    ids_per_cluster = [[intern(src.get(field) or "") for field in _CLUSTER_FIELDS] for src in clusters]
+
+    index, offset = [], 0
+    for data in strings:
+        index.append(struct.pack("<II", offset, len(data)))
+        offset += len(data)
+    table, scripts = [], []
+    for src, string_ids in zip(clusters, ids_per_cluster):
+        packed = zlib.compress(src["script"].encode("utf-8"), 9)
+        table.append(_CLUSTER.pack(*string_ids, offset, len(packed)))
+        scripts.append(packed)
+        offset += len(packed)
+    if offset > 0xFFFFFFFF:
+        raise ValueError("content pack blob exceeds 4 GiB")
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT,
+        0,
+        version,
+        len(strings),
+        len(source.get("pools", {})),
+        len(source.get("lines", {})),
+        len(clusters),
+    )
+    return b"".join((header, *index, pools, lines, *table, *strings, *scripts))
+
+def build_pack(json_path: str, pack_path: str) -> None:
+    """Compile ``json_path`` to ``pack_path``, replacing it atomically."""
+    with open(json_path, encoding="utf-8") as f:
+        data = compile_pack(json.load(f))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(pack_path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, pack_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+# ---------- Loading ----------
+class ClusterTable(Sequence[Cluster]):
+    """Clusters of a loaded pack.
+
+    Only the fixed-size cluster records are read up front (and those stay in
+    the mmap); offers and clusters are decoded and parsed on first access and
+    kept per index, while scripts inflate through an LRU, so a worker's
+    memory tracks the words people actually read, not the deck. Serving
+    never indexes the table (``__getitem__`` parses the whole cluster, for
+    tools); it only asks for offers, titles and scripts.
+    """
+
+    def __init__(self, pack: "ContentPack", offset: int, count: int):
+        self._pack = pack
+        self._offset = offset
+        self._count = count
+        self._offers: List[Optional[Offer]] = [None] * count
+        self._clusters: List[Optional[Cluster]] = [None] * count
+        self.script = functools.lru_cache(maxsize=SCRIPT_CACHE)(self._inflate)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, idx: int) -> Tuple[int, ...]:
+        if not 0 <= idx < self._count:
+            raise IndexError(idx)
+        return _CLUSTER.unpack_from(self._pack.buf, self._offset + idx * _CLUSTER.size)
+
+    def _inflate(self, idx: int) -> str:
+        offset, length = self._record(idx)[-2:]
+        start = self._pack._blob + offset
+        return zlib.decompress(self._pack.buf[start:start + length]).decode("utf-8")
+
+    def title(self, idx: int) -> str:
+        return self._pack.string(self._record(idx)[0])
+
+    def offer(self, idx: int) -> Offer:
+        offer = self._offers[idx]
+        if offer is None:
+            title, intro_line, continue_q = map(self._pack.string, self._record(idx)[:3])
+            offer = self._offers[idx] = make_offer(title, intro_line, continue_q)
+        return offer
+
+    def __getitem__(self, idx: int) -> Cluster:  # type: ignore[override]
+        cluster = self._clusters[idx]
+        if cluster is None:
+            if idx < 0:
+                idx += self._count
+            ids = self._record(idx)
+            src = {field: self._pack.string(sid) for field, sid in zip(_CLUSTER_FIELDS, ids)}
+            cluster = self._clusters[idx] = compile_cluster({**src, "script": self.script(idx)})
+        return cluster
+
+class ContentPack:
+    """A compiled pack over a buffer (normally an ``mmap`` of the file)."""
+
+    def __init__(self, buf: Any):
+        self.buf = buf
+        magic, fmt, _, version, n_strings, n_pools, n_lines, n_clusters = _HEADER.unpack_from(buf)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError("not a Word Psychic content pack (or an unsupported format)")
+        self.version = version
+        pos = _HEADER.size
+        self._index = memoryview(buf)[pos:pos + 8 * n_strings].cast("I")
+        pos += 8 * n_strings
+
+        raw_pools = []
+        for _ in range(n_pools):
+            name, count = struct.unpack_from("<II", buf, pos)
+            raw_pools.append((name, struct.unpack_from(f"<{count}I", buf, pos + 8)))
+            pos += 8 + 4 * count
+        raw_lines = struct.unpack_from(f"<{2 * n_lines}I", buf, pos)
+        pos += 8 * n_lines
+        self.clusters = ClusterTable(self, pos, n_clusters)
+        self._blob = pos + n_clusters * _CLUSTER.size
+
+        self.pools: Dict[str, Tuple[str, ...]] = {
+            self.string(name): tuple(self.string(i) for i in items) for name, items in raw_pools
+        }
+        self.lines: Dict[str, str] = {
+            self.string(raw_lines[i]): self.string(raw_lines[i + 1]) for i in range(0, len(raw_lines), 2)
+        }
+
+    def string(self, sid: int) -> str:
+        offset, length = self._index[2 * sid], self._index[2 * sid + 1]
+        start = self._blob + offset
+        return str(self.buf[start:start + length], "utf-8")
+
+def open_pack(path: str) -> ContentPack:
+    """Load a pack from ``path``.
+
+    A ``.json`` path is compiled to a ``.wpk`` beside it first (rebuilt when
+    the JSON is newer or the file is from an older format); if that file
+    cannot be written the pack is compiled in memory instead.
+    """
+    if not path.endswith(".json"):
+        return _map_pack(path)
+    pack_path = path[: -len(".json")] + ".wpk"
+    try:
+        if os.path.exists(pack_path) and os.path.getmtime(pack_path) >= os.path.getmtime(path):
+            try:
+                return _map_pack(pack_path)
+            except ValueError:
+                pass
+        build_pack(path, pack_path)
+    except OSError:
+        with open(path, encoding="utf-8") as f:
+            return ContentPack(compile_pack(json.load(f)))
+    return _map_pack(pack_path)
+
+def _map_pack(path: str) -> ContentPack:
+    with open(path, "rb") as f:
+        return ContentPack(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python content.py PACK.json PACK.wpk")
+    build_pack(sys.argv[1], sys.argv[2])
@@ -0,0 +1,329 @@
+"""Word Psychic conversation engine.
+
+Pure Python: no FastAPI, pydantic or request objects. A session is a
+``sessions.Session`` and ``step(session, answer)`` returns the reply text
+plus the updated session, so the HTTP layer, a CLI or a load simulation can
+all drive the same conversation.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import os
+
+from content import ContentPack, open_pack
+from sessions import Phase, Session
+
+# ---------- Content ----------
+# WP_CONTENT_PACK may point at a pack's .json source or its compiled .wpk.
+DEFAULT_PACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content_pack.json")
+
+# Every pack loaded by this process, by version. Sessions remember the version
+# they started on, so a reload never re-points their cluster indices.
+PACKS: Dict[int, ContentPack] = {}
+ACTIVE: ContentPack
+
+POOLS = ("another_word", "goodbyes", "courteous_exit", "decline_confirm",
+         "invalid_yn", "invalid_yne", "continue_q", "reoffer")
+LINES = ("short_hint_opening", "short_hint", "spirits_quiet", "asked_twice",
+         "session_complete", "session_expired", "opening_guidance")
+
+def load_content(path: Optional[str] = None) -> ContentPack:
+    """Load a pack and make it the one new sessions start on."""
+    global ACTIVE
+    pack = open_pack(path or os.environ.get("WP_CONTENT_PACK") or DEFAULT_PACK)
+    missing = [n for n in POOLS if not pack.pools.get(n)] + [n for n in LINES if n not in pack.lines]
+    if missing or not pack.clusters:
+        raise ValueError(f"content pack {pack.version} is incomplete: {missing or 'no clusters'}")
+    old = PACKS.get(pack.version)
+    if old is not None and bytes(old.buf) != bytes(pack.buf):
+        raise ValueError(f"content pack version {pack.version} is already loaded with different content")
+    PACKS.setdefault(pack.version, pack)
+    ACTIVE = PACKS[pack.version]
+    return ACTIVE
+
+load_content()
+
+def content(st: Session) -> ContentPack:
+    return PACKS[st.pack]
+
+def choose_decline_confirm(st: Session) -> str:
+    return st.choice(content(st).pools["decline_confirm"])
+
+def choose_invalid_yn(st: Session) -> str:
+    return st.choice(content(st).pools["invalid_yn"])
+
+def choose_invalid_yne(st: Session) -> str:
+    return st.choice(content(st).pools["invalid_yne"])
+
+def choose_continue_q(st: Session) -> str:
+    return st.choice(content(st).pools["continue_q"])
+
+def choose_reoffer_prompt(st: Session) -> str:
+    return st.choice(content(st).pools["reoffer"])
+
+def static_replies(pack: ContentPack) -> List[Tuple[str, bool]]:
+    """Every (text, done) reply that comes verbatim from ``pack``, so the HTTP
+    layer can pre-encode them."""
+    pools, lines = pack.pools, pack.lines
+    return [
+        *((text, False) for text in pools["invalid_yn"]),
+        *((text, False) for text in pools["invalid_yne"]),
+        *((text, False) for text in pools["decline_confirm"]),
+        *((text, False) for text in pools["reoffer"]),
+        *((text, True) for text in pools["goodbyes"]),
+        (lines["spirits_quiet"], True),
+        (lines["asked_twice"], True),
+        (lines["session_complete"], True),
+        (lines["session_expired"], True),
+    ]
+
+# ---------- Session helpers ----------
+def new_session(sid: Optional[str] = None, history: bool = False, seed: Optional[int] = None) -> Session:
+    """Start a session on the active pack; ``seed`` fixes every word order
+    and reply variant (random when omitted)."""
+    if seed is None:
+        seed = int.from_bytes(os.urandom(4), "little")
+    st = Session(len(ACTIVE.clusters), seed, ACTIVE.version)
+    st.sid = sid
+    if history:
+        st.start_history()
+    return st
+
+def normalize(a: str) -> str:
+    a = a.strip().lower()
+    if a in {"y", "yes"}:
+        return "yes"
+    if a in {"n", "no"}:
+        return "no"
+    if a in {"q", "quit"}:
+        return "quit"
+    if a in {"s", "stop", "enough", "end"}:
+        return "stop"
+    return a
+
+class Reply(NamedTuple):
+    text: str
+    done: bool = False
+
+def reply(st: Session, text: str, *, done: bool = False) -> Reply:
+    return Reply(text, done)
+
+def choose_another_word(st: Session) -> str:
+    return st.choice(content(st).pools["another_word"])
+
+def choose_goodbye(st: Session) -> str:
+    return st.choice(content(st).pools["goodbyes"])
+
+def choose_exit_blessing(st: Session) -> str:
+    return st.choice(content(st).pools["courteous_exit"])
+
+def guidance_flow(st: Session, *, opening: bool) -> Optional[str]:
+    if opening and not st.instruction_shown:
+        st.instruction_shown = True
+        st.short_hint_shown = False
+        return content(st).lines["short_hint_opening"]
+    if st.instruction_shown and not st.short_hint_shown:
+        st.short_hint_shown = True
+        return content(st).lines["short_hint"]
+    return None
+
+def words_revealed(st: Session) -> List[str]:
+    clusters = content(st).clusters
+    return [clusters.title(idx) for idx in st.revealed]
+
+def summary_text(words: List[str]) -> str:
+    if not words:
+        return "No words were revealed this time. The veil remains for another day."
+    lines = "\n\n".join(title for title in words)
+    return "Here are the words that visited you from the beyond:\n\n" + lines
+
+def closing_block(st: Session) -> str:
+    closing = summary_text(words_revealed(st))
+    if st.revealed:
+        closing += "\n\nCarry these words carefully; they will open doors when you need them."
+    blessing = choose_exit_blessing(st).rstrip()
+    closing += "\n" + (blessing if blessing[-1] in ".!?" else blessing + ".")
+    return closing
+
+def pick_continue_question(st: Session, base: str) -> str:
+    if base and st.randbelow(20) < 7:  # 35%
+        return base
+    return choose_continue_q(st)
+
+def offer_next_word(st: Session) -> Reply:
+    if st.remaining:
+        idx = st.next_index()
+        st.current_idx = idx
+        st.phase = Phase.AWAIT_CONTINUE
+        offer = content(st).clusters.offer(idx)
+
+        intro = offer.new_word_line if st.first_offer_done else offer.intro_line
+        continue_q = pick_continue_question(st, offer.continue_q)
+        text = f"{intro}{continue_q}"
+        return reply(st, text)
+
+    if st.rejected:
+        if st.reoffer_attempts >= 2:
+            st.phase = Phase.DONE
+            if st.revealed:
+                return reply(st, closing_block(st), done=True)
+            return reply(st, content(st).lines["asked_twice"], done=True)
+
+        st.phase = Phase.REOFFER_PROMPT
+        st.reoffer_attempts += 1
+        st.short_hint_shown = False
+        return reply(st, choose_reoffer_prompt(st))
+
+    st.phase = Phase.DONE
+    closing = "You have received all available words for this session.\n" + closing_block(st)
+    return reply(st, closing, done=True)
+
+# ---------- State machine ----------
+# normalize() output -> answer column; anything unrecognised is OTHER.
+YES, NO, STOP, OTHER = range(4)
+ANSWER_CLASSES = {"yes": YES, "no": NO, "quit": STOP, "stop": STOP}
+
+Handler = Callable[[Session], Reply]
+
+def on_stop(st: Session) -> Reply:
+    st.phase = Phase.DONE
+    return reply(st, closing_block(st), done=True)
+
+def on_quiet(st: Session) -> Reply:
+    st.phase = Phase.DONE
+    return reply(st, content(st).lines["spirits_quiet"], done=True)
+
+def on_invalid_yn(st: Session) -> Reply:
+    return reply(st, choose_invalid_yn(st))
+
+def on_invalid_yne(st: Session) -> Reply:
+    return reply(st, choose_invalid_yne(st))
+
+def on_intro_yes(st: Session) -> Reply:
+    st.first_offer_done = False
+    return offer_next_word(st)
+
+def on_intro_no(st: Session) -> Reply:
+    st.phase = Phase.DONE
+    return reply(st, choose_goodbye(st), done=True)
+
+def on_reveal(st: Session) -> Reply:
+    idx = st.current_idx
+    if idx < 0:
+        return on_quiet(st)
+    script = content(st).clusters.script(idx)
+
+    st.revealed.append(idx)
+    st.first_offer_done = True
+    st.short_hint_shown = False
+
+    st.phase = Phase.POST_REVEAL
+    another = choose_another_word(st)
+    g = guidance_flow(st, opening=False)
+
+    tail = f"\n\n{another}" + (f"\n{g}" if g else "")
+    return reply(st, script + "\n\n" + tail)
+
+def on_decline(st: Session) -> Reply:
+    if st.current_idx >= 0:
+        st.reject(st.current_idx)
+
+    st.first_offer_done = True
+    st.phase = Phase.DECLINE_CONFIRM
+    st.short_hint_shown = False
+    return reply(st, choose_decline_confirm(st))
+
+def on_reoffer_yes(st: Session) -> Reply:
+    st.reoffer_rejected()
+    st.first_offer_done = True
+    return offer_next_word(st)
+
+def on_reoffer_no(st: Session) -> Reply:
+    st.phase = Phase.DONE
+    lines = content(st).lines
+    text = lines["asked_twice"] if st.reoffer_attempts >= 2 else lines["session_complete"]
+    if st.revealed:
+        text = closing_block(st)
+    return reply(st, text, done=True)
+
+TRANSITION_SPEC: Dict[Phase, Dict[int, Handler]] = {
+    Phase.INTRO: {YES: on_intro_yes, NO: on_intro_no, OTHER: on_invalid_yn},
+    Phase.AWAIT_CONTINUE: {YES: on_reveal, NO: on_decline, OTHER: on_invalid_yne},
+    Phase.DECLINE_CONFIRM: {YES: offer_next_word, NO: on_stop, OTHER: on_invalid_yne},
+    Phase.POST_REVEAL: {YES: offer_next_word, NO: on_stop, OTHER: on_invalid_yne},
+    Phase.REOFFER_PROMPT: {YES: on_reoffer_yes, NO: on_reoffer_no, OTHER: on_reoffer_no},
+}
+
+def compile_transitions(spec: Dict[Phase, Dict[int, Handler]]) -> List[Handler]:
+    """Flatten ``spec`` into one list indexed by ``phase * 4 + answer``.
+
+    STOP always closes the session; phases or answers missing from ``spec``
+    fall through to ``on_quiet``.
+    """
+    table: List[Handler] = []
+    for phase in Phase:
+        row = spec.get(phase, {})
+        for answer in (YES, NO, STOP, OTHER):
+            table.append(on_stop if answer == STOP else row.get(answer, on_quiet))
+    return table
+
+TRANSITIONS = compile_transitions(TRANSITION_SPEC)
+
+def advance(st: Session, a: str) -> Reply:
+    """Apply an already-normalized answer to ``st`` in place."""
+    code = ANSWER_CLASSES.get(a, OTHER)
+    if st.history is not None:
+        st.history.append(code)
+    return TRANSITIONS[st.phase * 4 + code](st)
+
+def repeat_reply(st: Session) -> Reply:
+    """The reply to ``st``'s last numbered answer, rebuilt by replaying that
+    answer on the state it was given in."""
+    before = Session.from_bytes(st.sid, st.last_reply[1:])
+    return TRANSITIONS[before.phase * 4 + st.last_reply[0]](before)
+
+def replay(sid: Optional[str], events: bytes) -> Optional[Session]:
+    """Rebuild a session from ``Session.events()``; None if its pack is gone.
+
+    The last answer marked ``Session.NUMBERED`` is remembered as the one
+    numbered ``last_seq``.
+    """
+    pack, last_seq, seed = Session._EVENTS.unpack_from(events)
+    if pack not in PACKS:
+        return None
+    st = Session(len(PACKS[pack].clusters), seed, pack)
+    st.sid = sid
+    codes = events[Session._EVENTS.size:]
+    numbered = Session.NUMBERED
+    last = len(codes) - 1
+    while last >= 0 and not codes[last] & numbered:
+        last -= 1
+    for i, code in enumerate(codes):
+        code &= 3
+        if i == last:
+            st.remember_reply(last_seq, code, st.to_bytes(with_reply=False))
+        TRANSITIONS[st.phase * 4 + code](st)
+    st.history = bytearray(events[Session._EVENTS_PREFIX.size:])
+    return st
+
+def step(st: Session, answer: str) -> Tuple[Reply, Session]:
+    """Answer one prompt: returns the reply and the (updated) session."""
+    return advance(st, normalize(answer)), st
+
+# ---------- CLI ----------
+def main() -> None:
+    st = new_session("cli")
+    print(ACTIVE.lines["opening_guidance"])
+    while True:
+        try:
+            answer = input("> ")
+        except EOFError:
+            answer = "end"
+        out, st = step(st, answer)
+        print(out.text)
+        if out.done:
+            break
+
+if __name__ == "__main__":
+    main()
+
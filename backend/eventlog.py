@@ -0,0 +1,143 @@
+"""Append-only log of conversation transitions, for funnel analysis.
+
+Every ``/choose`` that moves a session appends one fixed-size binary record.
+The request thread only appends a tuple to a deque; a background writer
+encodes whatever has queued up, writes it with one call and fsyncs once per
+``commit_interval``, and starts a new file every ``rotate_bytes``.
+
+File layout (little-endian)::
+
+    header   magic "WPEL", format u16, record size u16, created unix time f64
+    records  sid key u64, unix time f64, cluster i32, pack version u16,
+             phase before << 4 | phase after u8, answer code u8
+
+The sid key is ``Session.log_key()``, which stays the same across a
+session's life even when its id does not (stateless tokens). The
+cluster is the one on offer after the transition (-1 before the first
+offer). Phases are ``sessions.Phase`` values and answers ``engine.YES``..
+``engine.OTHER``. A crash can leave a partial record at the end of a file;
+readers ignore it.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Tuple
+import atexit
+import glob
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"WPEL"
+FORMAT = 1
+HEADER = struct.Struct("<4sHHd")
+RECORD = struct.Struct("<QdiHBB")
+
+Pending = Tuple[int, float, int, int, int, int]
+
+class TransitionLog:
+    """Background-written, rotated transition log in directory ``path``.
+
+    Each worker writes its own files (named by start time and pid), so
+    several processes can share one directory. If the writer falls more than
+    ``max_pending`` records behind, new records are dropped and counted
+    rather than queued without bound.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        rotate_bytes: int = 256 << 20,
+        commit_interval: float = 0.2,
+        max_pending: int = 1_000_000,
+    ):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.commit_interval = commit_interval
+        self.max_pending = max_pending
+        os.makedirs(path, exist_ok=True)
+        self._queue: Deque[Pending] = deque()
+        self.written = 0
+        self.dropped = 0
+        self.files = 0
+        self._file = self._open()
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="transition-log", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, key: int, pack: int, before: int, after: int, answer: int, cluster: int) -> None:
+        """Queue one transition of the session with log key ``key``; never blocks."""
+        if len(self._queue) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._queue.append((key, time.time(), cluster, pack, before << 4 | after, answer))
+
+    # ----- writer -----
+    def _open(self) -> Any:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        name = f"transitions-{stamp}-{os.getpid()}-{self.files:04d}.wpl"
+        f = open(os.path.join(self.path, name), "ab")
+        f.write(HEADER.pack(MAGIC, FORMAT, RECORD.size, time.time()))
+        self.files += 1
+        return f
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(self.commit_interval):
+            self._commit()
+        self._commit()
+
+    def _commit(self) -> None:
+        queue, batch = self._queue, []
+        while queue:
+            batch.append(queue.popleft())
+        if not batch:
+            return
+        encode = RECORD.pack
+        data = b"".join(encode(*pending) for pending in batch)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.written += len(batch)
+        if self._file.tell() >= self.rotate_bytes:
+            self._file.close()
+            self._file = self._open()
+
+    def close(self) -> None:
+        if not self._stop.is_set():
+            self._stop.set()
+            self._writer.join()
+            self._file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "written": self.written,
+            "pending": len(self._queue),
+            "dropped": self.dropped,
+            "files": self.files,
+        }
+
+# ---------- Reading ----------
+def log_files(path: str) -> List[str]:
+    """Every transition log under ``path`` (a directory or a single file)."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "transitions-*.wpl")))
+    return [path]
+
+def read_header(f: Any) -> float:
+    """Check a log file's header; returns its creation time."""
+    magic, fmt, size, created = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or fmt != FORMAT or size != RECORD.size:
+        raise ValueError("not a Word Psychic transition log (or an unsupported format)")
+    return created
+
+def read(path: str) -> Iterator[Tuple[int, float, int, int, int, int, int]]:
+    """Yield (sid key, time, cluster, pack, phase before, phase after, answer)."""
+    for name in log_files(path):
+        with open(name, "rb") as f:
+            read_header(f)
+            data = f.read()
+        whole = len(data) - len(data) % RECORD.size
+        for key, ts, cluster, pack, phases, answer in RECORD.iter_unpack(data[:whole]):
+            yield key, ts, cluster, pack, phases >> 4, phases & 15, answer
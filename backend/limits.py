@@ -0,0 +1,301 @@
+"""Admission control for the Word Psychic API.
+
+Plain ASGI middleware, so a refused request costs a dict lookup or a byte
+count and a canned 429/413 before FastAPI routes, parses or allocates
+anything.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import threading
+import time
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# ---------- Token buckets ----------
+class TokenBuckets:
+    """One token bucket per client key, in an LRU capped at ``max_clients``.
+
+    A bucket holds up to ``burst`` tokens and refills at ``rate`` per second.
+    When the table is full the least recently seen client is dropped; it
+    comes back with a full bucket, so memory stays bounded and the worst
+    case is a forgotten client getting one extra burst.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, now: float) -> bool:
+        buckets = self._buckets
+        entry = buckets.get(key)
+        if entry is None:
+            tokens = self.burst
+            if len(buckets) >= self.max_clients:
+                buckets.popitem(last=False)
+        else:
+            tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+            buckets.move_to_end(key)
+        if tokens < 1.0:
+            buckets[key] = (tokens, now)
+            return False
+        buckets[key] = (tokens - 1.0, now)
+        return True
+
+# ---------- Live sessions ----------
+class SessionQuota:
+    """Live sessions per client key.
+
+    A session counts against its client from ``add`` until ``release``
+    (it finished) or until ``ttl`` seconds pass without a ``touch`` (the
+    store's idle TTL, so it expired there too). Sessions are kept oldest
+    touch first, so expiring them pops from the front; past
+    ``max_sessions`` the oldest is forgotten early. Handlers may run on the
+    threadpool, so unlike the buckets this takes a lock.
+    """
+
+    def __init__(self, per_client: int, ttl: float, max_sessions: int = 1_000_000):
+        self.per_client = per_client
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self._live: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def _drop(self, client: str) -> None:
+        left = self._live[client] - 1
+        if left:
+            self._live[client] = left
+        else:
+            del self._live[client]
+
+    def _expire(self, now: float) -> None:
+        sessions = self._sessions
+        while sessions:
+            key, (client, touched) = next(iter(sessions.items()))
+            if now - touched <= self.ttl and len(sessions) <= self.max_sessions:
+                return
+            del sessions[key]
+            self._drop(client)
+
+    def full(self, client: str, now: float) -> bool:
+        with self._lock:
+            self._expire(now)
+            return self._live.get(client, 0) >= self.per_client
+
+    def add(self, key: int, client: str, now: float) -> None:
+        with self._lock:
+            if key in self._sessions:
+                return
+            self._sessions[key] = (client, now)
+            self._live[client] = self._live.get(client, 0) + 1
+            self._expire(now)
+
+    def touch(self, key: int, now: float) -> None:
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                self._sessions[key] = (entry[0], now)
+                self._sessions.move_to_end(key)
+
+    def release(self, key: int) -> None:
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            if entry is not None:
+                self._drop(entry[0])
+
+# ---------- Admission ----------
+class Admission:
+    """Per-client request rate and live-session limits.
+
+    Every request to ``paths`` spends a token from the client's request
+    bucket (``rate``/s, ``burst`` deep). ``/start`` is refused while the
+    client holds ``sessions_per_client`` live sessions: the app reports
+    each session it starts (``started``), answers (``answered``) and
+    finishes, and one left idle for ``session_ttl`` stops counting. Counts
+    are per worker. The client is the peer address, or with
+    ``trust_proxy`` the last X-Forwarded-For hop (the one our own proxy
+    appended); behind a proxy without it every client shares one key. The
+    buckets are only used from the event loop, so they take no lock.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: float = 30.0,
+        sessions_per_client: int = 20,
+        session_ttl: float = 3600.0,
+        max_clients: int = 100_000,
+        trust_proxy: bool = False,
+        paths: Tuple[str, ...] = ("/start", "/choose", "/choose/"),
+    ):
+        self.paths = frozenset(paths)
+        self.trust_proxy = trust_proxy
+        self.requests = TokenBuckets(rate, burst, max_clients) if rate > 0 else None
+        self.sessions = SessionQuota(sessions_per_client, session_ttl) if sessions_per_client > 0 else None
+        self.counters = {"admitted": 0, "rate_limited": 0, "session_limited": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.sessions is not None
+
+    def client(self, scope: Scope) -> str:
+        if self.trust_proxy:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").rpartition(",")[2].strip()
+        peer: Optional[Tuple[str, int]] = scope.get("client")
+        return peer[0] if peer else ""
+
+    def refusal(self, scope: Scope) -> Optional[str]:
+        """Why this request is refused ("rate_limited" or "session_limited"), or None."""
+        path = scope.get("path")
+        if path not in self.paths or scope.get("method") == "OPTIONS":
+            return None
+        key = self.client(scope)
+        now = time.monotonic()
+        if self.requests is not None and not self.requests.take(key, now):
+            reason = "rate_limited"
+        elif path == "/start" and self.sessions is not None and self.sessions.full(key, now):
+            reason = "session_limited"
+        else:
+            reason = "admitted"
+        self.counters[reason] += 1
+        return None if reason == "admitted" else reason
+
+    def admit(self, scope: Scope) -> bool:
+        return self.refusal(scope) is None
+
+    def started(self, scope: Scope, key: int) -> None:
+        """Count session ``key`` (a ``Session.log_key``) against the client."""
+        if self.sessions is not None:
+            self.sessions.add(key, self.client(scope), time.monotonic())
+
+    def answered(self, key: int, done: bool) -> None:
+        if self.sessions is not None:
+            if done:
+                self.sessions.release(key)
+            else:
+                self.sessions.touch(key, time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "tracked_clients": len(self.requests or ()) + len(self.sessions or ()),
+        }
+
+# ---------- Middleware ----------
+TOO_MANY = b'{"detail":"Too many requests"}'
+_TOO_MANY_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(TOO_MANY)).encode()),
+]
+# A token comes back within a second; a session slot only when one of the
+# client's sessions finishes or idles out, so no retry hint for that one.
+_REFUSED_HEADERS = {
+    "rate_limited": _TOO_MANY_HEADERS + [(b"retry-after", b"1")],
+    "session_limited": _TOO_MANY_HEADERS,
+}
+
+class AdmissionMiddleware:
+    """Answers requests ``admission`` refuses with a canned 429."""
+
+    def __init__(self, app: ASGIApp, admission: Admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        reason = None if scope["type"] != "http" else self.admission.refusal(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": 429, "headers": _REFUSED_HEADERS[reason]})
+        await send({"type": "http.response.body", "body": TOO_MANY})
+
+# ---------- Body size ----------
+TOO_LARGE = b'{"detail":"Request body too large"}'
+_TOO_LARGE_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(TOO_LARGE)).encode()),
+    (b"connection", b"close"),
+]
+
+class BodyLimit:
+    """Upper bound on request bodies, and how often it was hit."""
+
+    def __init__(self, max_bytes: int = 4096):
+        self.max_bytes = max_bytes
+        self.counters = {"declared_too_large": 0, "streamed_too_large": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_bytes": self.max_bytes, **self.counters}
+
+class BodyLimitMiddleware:
+    """Buffers request bodies up to ``limit.max_bytes`` and answers 413 past it.
+
+    A Content-Length over the limit is refused without reading anything;
+    otherwise chunks are counted as they arrive (chunked uploads, or a
+    client that lies about the length) and reading stops at the limit. The
+    app then receives the buffered body as a single message.
+    """
+
+    def __init__(self, app: ASGIApp, limit: BodyLimit):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("method") in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+        max_bytes = self.limit.max_bytes
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                if not value.isdigit() or int(value) > max_bytes:
+                    self.limit.counters["declared_too_large"] += 1
+                    await self._refuse(send)
+                    return
+                break
+
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return  # client went away
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > max_bytes:
+                self.limit.counters["streamed_too_large"] += 1
+                await self._refuse(send)
+                return
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay() -> Dict[str, Any]:
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay, send)
+
+    @staticmethod
+    async def _refuse(send: Send) -> None:
+        await send({"type": "http.response.start", "status": 413, "headers": _TOO_LARGE_HEADERS})
+        await send({"type": "http.response.body", "body": TOO_LARGE})
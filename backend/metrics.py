@@ -0,0 +1,150 @@
+"""Prometheus-style metrics for the Word Psychic API.
+
+Counters and histograms are sharded per thread: each thread increments
+its own dict, so neither the event loop nor the threadpool ever takes a
+lock to count something. A scrape sums the shards and renders the text
+exposition format (version 0.0.4).
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Tuple
+import threading
+import time
+
+from limits import ASGIApp, Receive, Scope, Send
+
+Labels = Tuple[Tuple[str, str], ...]
+Key = Tuple[str, Labels]
+
+# Seconds; the request path is tens of microseconds, a slow store is not.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# ---------- Sharded registry ----------
+class Metrics:
+    """Counters and fixed-bucket histograms, one shard per thread.
+
+    A shard is only written by its own thread. Readers copy each shard's
+    items in one C-level ``list()`` call, so a scrape may see a histogram
+    mid-update by one observation but never blocks or corrupts a writer.
+    """
+
+    def __init__(self, buckets: Iterable[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.help: Dict[str, Tuple[str, str]] = {}
+        self._local = threading.local()
+        self._shards: List[Tuple[Dict[Key, float], Dict[Key, List[float]]]] = []
+        self._shards_lock = threading.Lock()  # only taken once per thread
+
+    def describe(self, name: str, kind: str, text: str) -> None:
+        self.help[name] = (kind, text)
+
+    def _shard(self) -> Tuple[Dict[Key, float], Dict[Key, List[float]]]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, labels: Labels = (), n: float = 1) -> None:
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + n
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        """Record ``value`` in histogram ``name``: per-bucket counts, then
+        the sum and count."""
+        histograms = self._shard()[1]
+        key = (name, labels)
+        row = histograms.get(key)
+        if row is None:
+            row = histograms[key] = [0.0] * (len(self.buckets) + 3)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def collect(self) -> Tuple[Dict[Key, float], Dict[Key, List[float]]]:
+        counters: Dict[Key, float] = {}
+        histograms: Dict[Key, List[float]] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard_counters, shard_histograms in shards:
+            for key, value in list(shard_counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, row in list(shard_histograms.items()):
+                total = histograms.setdefault(key, [0.0] * len(row))
+                for i, value in enumerate(list(row)):
+                    total[i] += value
+        return counters, histograms
+
+    def render(self, gauges: Dict[Key, float] = {}) -> str:
+        """Everything counted so far plus ``gauges``, in exposition format."""
+        counters, histograms = self.collect()
+        families: Dict[str, List[str]] = {}
+        for (name, labels), value in sorted({**counters, **gauges}.items()):
+            families.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), row in sorted(histograms.items()):
+            lines = families.setdefault(name, [])
+            running = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                running += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {_number(running)}")
+            lines.append(f"{name}_sum{_labels(labels)} {row[-2]!r}")
+            lines.append(f"{name}_count{_labels(labels)} {_number(row[-1])}")
+        out = []
+        for name in sorted(families):
+            kind, text = self.help.get(name, ("untyped", ""))
+            if text:
+                out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(families[name])
+        return "\n".join(out) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# ---------- Middleware ----------
+class MetricsMiddleware:
+    """Counts and times every HTTP request by route and status.
+
+    Paths outside ``paths`` share the label ``other`` so scanners can't blow
+    up the label set.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: Metrics, paths: Iterable[str]):
+        self.app = app
+        self.metrics = metrics
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope.get("path", "")
+        endpoint = (path.rstrip("/") or "/") if path in self.paths else "other"
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - t0
+            metrics = self.metrics
+            metrics.inc("wp_http_requests_total", (("endpoint", endpoint), ("status", str(status))))
+            metrics.observe("wp_http_request_duration_seconds", (("endpoint", endpoint),), elapsed)
@@ -0,0 +1,1330 @@
+from __future__ import annotations
+
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from uuid import UUID
+import asyncio
+import atexit
+import base64
+import hashlib
+import hmac
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+T = TypeVar("T")
+
+try:
+    import fcntl
+except ImportError:  # Windows: the shared-memory backend is unavailable
+    fcntl = None
+
+# ---------- Session phases ----------
+class Phase(IntEnum):
+    INTRO = 0
+    AWAIT_CONTINUE = 1
+    DECLINE_CONFIRM = 2
+    POST_REVEAL = 3
+    REOFFER_PROMPT = 4
+    DONE = 5
+
+INSTRUCTION_SHOWN = 1
+SHORT_HINT_SHOWN = 2
+FIRST_OFFER_DONE = 4
+
+# ---------- Word order ----------
+def _round(x: int, key: int) -> int:
+    x = ((x ^ key) * 0x45D9F3B) & 0xFFFFFFFF
+    return x ^ (x >> 16)
+
+def permute(k: int, n: int, seed: int) -> int:
+    """Return the ``k``-th element of a seeded permutation of ``range(n)``.
+
+    A four-round Feistel network is a bijection on ``2**(2*half)`` values;
+    cycle-walking (re-encrypting until the value lands below ``n``) narrows
+    it to ``range(n)``. The domain is under ``4 * n``, so this averages
+    fewer than four walks and needs no per-session table. ``k`` outside
+    ``range(n)`` (including any ``k`` when ``n <= 0``) raises IndexError
+    rather than walking forever.
+    """
+    if not 0 <= k < n:
+        raise IndexError(k)
+    half = max(1, ((n - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    keys = [(seed * (r + 1) * 0x9E3779B1) & 0xFFFFFFFF for r in range(4)]
+    x = k
+    while True:
+        left, right = x >> half, x & mask
+        for key in keys:
+            left, right = right, left ^ (_round(right, key) & mask)
+        x = (left << half) | right
+        if x < n:
+            return x
+
+def rekey(seed: int) -> int:
+    return (seed * 0x9E3779B1 + 0x7F4A7C15) & 0xFFFFFFFF
+
+# ---------- Per-session randomness ----------
+# A 32-bit LCG (Numerical Recipes constants). Draws use the high bits via a
+# multiply-shift, which is where an LCG is strongest; plenty for picking
+# prompt variants, and the whole state is one int in the session.
+def rng_seed(seed: int) -> int:
+    return (seed ^ 0x5DEECE66) & 0xFFFFFFFF
+
+# ---------- Session state ----------
+class Session:
+    """Compact per-session state.
+
+    The words still to offer are the permutation ``permute(k, size, seed)``
+    for ``k`` from ``cursor`` up to ``size``, over the whole deck while
+    ``pool`` is None and over ``pool`` (the re-offered rejects) after that.
+    ``revealed`` and ``rejected`` (None until the first decline) are
+    ``array('I')`` cluster indices in the order they happened, so decks past
+    64k words fit; the three booleans share one ``flags`` int and
+    ``current_idx`` is -1 when nothing is on offer. Indices refer to content
+    pack version ``pack``, which stays fixed for the session.
+    ``last_seq``/``last_reply`` remember the latest numbered answer (its
+    code and the record of the state it was given in) so a client retry can
+    be answered again without advancing (see ``engine.repeat_reply``); that
+    is a few dozen bytes where the reply text can be kilobytes. ``rng`` is the session's
+    own generator state (see ``choice``), started from ``seed``, so a seed
+    plus the answers reproduce every reply exactly. ``history`` is None
+    unless the session is event sourced (see ``EventSourcedSessionStore``).
+    ``key`` caches ``log_key()``; like ``sid`` it is not part of the record.
+    """
+
+    __slots__ = (
+        "sid",
+        "phase",
+        "flags",
+        "reoffer_attempts",
+        "current_idx",
+        "seed",
+        "cursor",
+        "size",
+        "pool",
+        "rejected",
+        "revealed",
+        "last_seq",
+        "last_reply",
+        "pack",
+        "rng",
+        "history",
+        "key",
+    )
+
+    def __init__(self, size: int = 0, seed: int = 0, pack: int = 0):
+        self.sid: Optional[str] = None
+        self.phase = Phase.INTRO
+        self.flags = 0
+        self.reoffer_attempts = 0
+        self.current_idx = -1
+        self.seed = seed
+        self.cursor = 0
+        self.size = size
+        self.pool: Optional[array] = None
+        self.rejected: Optional[array] = None
+        self.revealed = array("I")
+        self.last_seq = 0
+        self.last_reply: Optional[bytes] = None
+        self.pack = pack
+        self.rng = rng_seed(seed)
+        self.history: Optional[bytearray] = None
+        self.key: Optional[int] = None
+
+    @property
+    def remaining(self) -> int:
+        return self.size - self.cursor
+
+    def next_index(self) -> int:
+        k = permute(self.cursor, self.size, self.seed)
+        self.cursor += 1
+        return k if self.pool is None else self.pool[k]
+
+    def randbelow(self, n: int) -> int:
+        """Next draw from the session's generator, in ``range(n)``."""
+        self.rng = x = (self.rng * 1664525 + 1013904223) & 0xFFFFFFFF
+        return (x * n) >> 32
+
+    def choice(self, seq: Sequence[T]) -> T:
+        return seq[self.randbelow(len(seq))]
+
+    def log_key(self) -> int:
+        """A 64-bit id that stays the same for the session's whole life: the
+        first 8 bytes of a BLAKE2b hash of its first id (the starting seed
+        without one). Token sessions carry it, as their id changes with every
+        answer."""
+        if self.key is None:
+            if self.sid is None:
+                self.key = self.seed
+            else:
+                self.key = int.from_bytes(hashlib.blake2b(self.sid.encode(), digest_size=8).digest(), "little")
+        return self.key
+
+    def reoffer_rejected(self) -> None:
+        """Start a fresh permutation over the rejected words and clear them."""
+        self.pool = array("I", self.rejected_indices())
+        self.size = len(self.pool)
+        self.cursor = 0
+        self.seed = rekey(self.seed)
+        self.rejected = None
+
+    # phase, flags, reoffer_attempts, current_idx, seed, cursor, size,
+    # len(pool) + 1 (0 for no pool), len(revealed), len(rejected),
+    # last_seq, len(last_reply), pack, rng
+    _HEADER = struct.Struct("<BBBiIIIIIIIHHI")
+
+    # pack, last_seq, starting seed; one answer code per byte follows, with
+    # NUMBERED set on the answers that came with a seq
+    _EVENTS = struct.Struct("<HII")
+    _EVENTS_PREFIX = struct.Struct("<HI")  # the part that isn't ``history``
+    NUMBERED = 0x80
+
+    def start_history(self) -> None:
+        """Record answer codes from here on; call before the first answer."""
+        self.history = bytearray(struct.pack("<I", self.seed))
+
+    def events(self) -> bytes:
+        """The session as its event log: replaying the answer codes from the
+        starting seed rebuilds everything else."""
+        return self._EVENTS_PREFIX.pack(self.pack, self.last_seq) + self.history
+
+    def is_repeat(self, seq: Optional[int]) -> bool:
+        """True for a ``seq`` at or before the latest answered one: a retry, or
+        a late request the client had already given up on."""
+        return seq is not None and self.last_reply is not None and seq <= self.last_seq
+
+    def remember_reply(self, seq: Optional[int], code: int, before: bytes) -> None:
+        """Record answer ``code`` numbered ``seq``, given in the state that
+        ``to_bytes(with_reply=False)`` returned as ``before``. Call it right
+        after that answer was applied, so its history code gets marked."""
+        if seq is None or not 0 < seq <= 0xFFFFFFFF:
+            return
+        self.last_seq = seq
+        self.last_reply = bytes((code,)) + before
+        if self.history is not None and len(self.history) > 4:
+            self.history[-1] |= self.NUMBERED
+
+    def to_bytes(self, with_reply: bool = True) -> bytes:
+        """Pack everything but ``sid`` (the store key) into a flat record."""
+        pool = b"" if self.pool is None else self.pool.tobytes()
+        rejected = b"" if self.rejected is None else self.rejected.tobytes()
+        last = self.last_reply if with_reply and self.last_reply is not None else b""
+        return b"".join((
+            self._HEADER.pack(
+                self.phase,
+                self.flags,
+                self.reoffer_attempts,
+                self.current_idx,
+                self.seed,
+                self.cursor,
+                self.size,
+                0 if self.pool is None else len(self.pool) + 1,
+                len(self.revealed),
+                len(rejected) // 4,
+                self.last_seq if last else 0,
+                len(last),
+                self.pack,
+                self.rng,
+            ),
+            pool,
+            self.revealed.tobytes(),
+            rejected,
+            last,
+        ))
+
+    @classmethod
+    def from_bytes(cls, sid: Optional[str], data: bytes) -> "Session":
+        (phase, flags, attempts, current, seed, cursor, size,
+         n_pool, n_revealed, n_rejected, last_seq, n_last, pack, rng) = cls._HEADER.unpack_from(data)
+        st = cls(size, seed, pack)
+        st.rng = rng
+        st.sid = sid
+        st.phase = Phase(phase)
+        st.flags = flags
+        st.reoffer_attempts = attempts
+        st.current_idx = current
+        st.cursor = cursor
+        pos = end = cls._HEADER.size
+        if n_pool:
+            end = pos + 4 * (n_pool - 1)
+            st.pool = array("I", data[pos:end])
+        pos, end = end, end + 4 * n_revealed
+        st.revealed.frombytes(data[pos:end])
+        if n_rejected:
+            pos, end = end, end + 4 * n_rejected
+            st.rejected = array("I", data[pos:end])
+        if n_last:
+            st.last_seq = last_seq
+            st.last_reply = bytes(data[end:end + n_last])
+        return st
+
+    def reject(self, idx: int) -> None:
+        if self.rejected is None:
+            self.rejected = array("I")
+        self.rejected.append(idx)
+
+    def approx_bytes(self) -> int:
+        """Rough in-memory size, for the store census."""
+        size = _SESSION_BYTES + 4 * len(self.revealed)
+        for extra in (self.pool, self.rejected):
+            if extra is not None:
+                size += _ARRAY_BYTES + 4 * len(extra)
+        if self.history is not None:
+            size += _BYTES_BYTES + len(self.history)
+        if self.last_reply is not None:
+            size += _BYTES_BYTES + len(self.last_reply)
+        return size
+
+    def rejected_indices(self) -> List[int]:
+        return sorted(set(self.rejected or ()))
+
+    def _flag(self, bit: int) -> bool:
+        return bool(self.flags & bit)
+
+    def _set_flag(self, bit: int, on: bool) -> None:
+        self.flags = (self.flags | bit) if on else (self.flags & ~bit)
+
+    @property
+    def instruction_shown(self) -> bool:
+        return self._flag(INSTRUCTION_SHOWN)
+
+    @instruction_shown.setter
+    def instruction_shown(self, on: bool) -> None:
+        self._set_flag(INSTRUCTION_SHOWN, on)
+
+    @property
+    def short_hint_shown(self) -> bool:
+        return self._flag(SHORT_HINT_SHOWN)
+
+    @short_hint_shown.setter
+    def short_hint_shown(self, on: bool) -> None:
+        self._set_flag(SHORT_HINT_SHOWN, on)
+
+    @property
+    def first_offer_done(self) -> bool:
+        return self._flag(FIRST_OFFER_DONE)
+
+    @first_offer_done.setter
+    def first_offer_done(self, on: bool) -> None:
+        self._set_flag(FIRST_OFFER_DONE, on)
+
+_SESSION_BYTES = sys.getsizeof(Session()) + sys.getsizeof(array("I"))
+_ARRAY_BYTES = sys.getsizeof(array("I"))
+_BYTES_BYTES = sys.getsizeof(b"")
+# A MemorySessionStore entry: the (touched, value, sig) tuple, its float,
+# a UUID-length sid and the ordered dict's slot and links.
+_ENTRY_BYTES = sys.getsizeof((0.0, None, 0)) + sys.getsizeof(0.0) + sys.getsizeof("0" * 36) + 48
+
+# ---------- Census ----------
+# Revealed-word counts at or above this share the last bucket.
+REVEALED_CAP = 32
+
+class Census:
+    """Live-session totals kept current on every store write.
+
+    Each stored session has a signature packing its phase, revealed count
+    (capped at ``REVEALED_CAP``) and approximate bytes into one int; the
+    store adds it on insert and removes the previous one on overwrite,
+    delete, expiry and eviction, so reading the totals is O(1). ``add``
+    and ``remove`` are called with the store's ``lock`` held; ``report``
+    takes it, so it never sees half an update.
+    """
+
+    def __init__(self, lock: Any) -> None:
+        self._lock = lock
+        self.phases = [0] * len(Phase)
+        self.revealed = [0] * (REVEALED_CAP + 1)
+        self.bytes = 0
+
+    @staticmethod
+    def signature(st: Session, nbytes: int) -> int:
+        return st.phase | min(len(st.revealed), REVEALED_CAP) << 3 | nbytes << 9
+
+    def add(self, sig: int) -> None:
+        self.phases[sig & 7] += 1
+        self.revealed[(sig >> 3) & 63] += 1
+        self.bytes += sig >> 9
+
+    def remove(self, sig: int) -> None:
+        self.phases[sig & 7] -= 1
+        self.revealed[(sig >> 3) & 63] -= 1
+        self.bytes -= sig >> 9
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            phases, revealed, nbytes = list(self.phases), list(self.revealed), self.bytes
+        return {
+            "live": sum(phases),
+            "phases": {phase.name.lower(): phases[phase] for phase in Phase},
+            "revealed": {
+                (f"{n}+" if n == REVEALED_CAP else str(n)): count
+                for n, count in enumerate(revealed)
+                if count
+            },
+            "approx_bytes": nbytes,
+        }
+
+# ---------- Locking ----------
+class LockStripes:
+    """A fixed pool of locks shared out by hashing the session id.
+
+    Requests for the same session always take the same lock, so they run one
+    at a time, while different sessions almost never contend. With ``path``
+    (a store's ``lock_path``) each stripe also holds a byte-range lock on
+    that file, so workers sharing a store exclude each other too; the
+    in-process lock is taken first, so only one thread per process ever
+    waits on the file lock for a stripe.
+    """
+
+    def __init__(self, stripes: int = 256, factory: Callable[[], Any] = threading.Lock, path: Optional[str] = None):
+        self._locks = [factory() for _ in range(stripes)]
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600) if path and fcntl is not None else None
+
+    def stripe(self, sid: Optional[str]) -> int:
+        # crc32, not hash(): every worker must pick the same stripe.
+        return zlib.crc32((sid or "").encode()) % len(self._locks)
+
+    def __call__(self, sid: Optional[str]) -> Any:
+        n = self.stripe(sid)
+        if self._fd is None:
+            return self._locks[n]
+        return _SharedStripe(self._locks[n], self._fd, n)
+
+class _SharedStripe:
+    """An in-process lock plus byte ``n`` of a lock file, as one (async)
+    context manager."""
+
+    __slots__ = ("lock", "fd", "n")
+
+    def __init__(self, lock: Any, fd: int, n: int):
+        self.lock = lock
+        self.fd = fd
+        self.n = n
+
+    def _file_lock(self) -> None:
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.n)
+
+    def _file_unlock(self) -> None:
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.n)
+
+    def __enter__(self) -> None:
+        self.lock.acquire()
+        try:
+            self._file_lock()
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def __exit__(self, *exc: Any) -> None:
+        self._file_unlock()
+        self.lock.release()
+
+    async def __aenter__(self) -> None:
+        await self.lock.acquire()
+        # Wait for other workers off the event loop. If we're cancelled
+        # meanwhile, the file lock is released as soon as it's granted.
+        waiter = asyncio.ensure_future(asyncio.to_thread(self._file_lock))
+        try:
+            await asyncio.shield(waiter)
+        except BaseException:
+            waiter.add_done_callback(lambda f: f.cancelled() or f.exception() or self._file_unlock())
+            self.lock.release()
+            raise
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self._file_unlock()
+        self.lock.release()
+
+# ---------- Session stores ----------
+class SessionStore:
+    """Where sessions live between requests.
+
+    ``get`` returns the session and refreshes its recency, ``put`` writes it
+    back after a mutation, ``touch`` refreshes without reading it. Backends
+    other than ``MemorySessionStore`` hand out copies, so callers must ``put``
+    whatever they changed.
+    """
+
+    max_sessions: int
+    ttl_seconds: float
+    expired = 0
+    evicted = 0
+    # In-process stores keep a Census; shared ones can't see other workers'
+    # writes, so they have none.
+    census: Optional["Census"] = None
+    # True when calls do I/O or take cross-process locks and so should stay
+    # off the event loop.
+    blocking = True
+    # True when new sessions should record their answers (Session.history).
+    keeps_history = False
+    # Set by stores shared between workers: the file ``LockStripes`` locks so
+    # same-session requests on different workers still run one at a time.
+    lock_path: Optional[str] = None
+
+    def get(self, sid: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    def put(self, sid: str, st: Session) -> None:
+        raise NotImplementedError
+
+    def touch(self, sid: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, sid: str) -> None:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, sid: str) -> bool:
+        return self.get(sid) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "live": len(self),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+class MemorySessionStore(SessionStore):
+    """In-process session map with an idle TTL and an LRU size cap.
+
+    Entries are kept in recency order, so refreshing a session is a single
+    ``move_to_end`` and idle entries always sit at the front where ``put``
+    sweeps them off. Each entry carries its ``Census`` signature so every
+    write, expiry and eviction keeps ``census`` current.
+    """
+
+    blocking = False
+
+    def __init__(self, max_sessions: int = 50_000, ttl_seconds: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        # sid -> (touched, session, census signature)
+        self._data: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.census = Census(self._lock)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def _live(self, sid: str, now: float) -> Any:
+        entry = self._data.get(sid)
+        if entry is None:
+            return None
+        if now - entry[0] > self.ttl_seconds:
+            del self._data[sid]
+            self.census.remove(entry[2])
+            self.expired += 1
+            return None
+        self._data[sid] = (now, entry[1], entry[2])
+        self._data.move_to_end(sid)
+        return entry[1]
+
+    def _insert(self, sid: str, touched: float, value: Any, sig: int) -> None:
+        old = self._data.get(sid)
+        if old is not None:
+            self.census.remove(old[2])
+        self._data[sid] = (touched, value, sig)
+        self._data.move_to_end(sid)
+        self.census.add(sig)
+
+    def get(self, sid: str) -> Optional[Session]:
+        now = time.monotonic()
+        with self._lock:
+            return self._live(sid, now)
+
+    def touch(self, sid: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return self._live(sid, now) is not None
+
+    def put(self, sid: str, st: Session) -> None:
+        now = time.monotonic()
+        sig = Census.signature(st, _ENTRY_BYTES + st.approx_bytes())
+        with self._lock:
+            self._insert(sid, now, st, sig)
+            self._sweep(now)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            entry = self._data.pop(sid, None)
+            if entry is not None:
+                self.census.remove(entry[2])
+
+    def _sweep(self, now: float) -> None:
+        data = self._data
+        while data:
+            touched = next(iter(data.values()))[0]
+            if now - touched <= self.ttl_seconds:
+                break
+            self.census.remove(data.popitem(last=False)[1][2])
+            self.expired += 1
+        while len(data) > self.max_sessions:
+            self.census.remove(data.popitem(last=False)[1][2])
+            self.evicted += 1
+
+class EventSourcedSessionStore(MemorySessionStore):
+    """Sessions kept as event logs and rebuilt by replay.
+
+    Idle sessions are stored as ``Session.events()`` (a dozen bytes plus
+    one per answer) and rebuilt with ``replay(sid, events)`` when a request
+    arrives; only the ``hot_sessions`` most recently used stay materialized.
+    A session without a history, or one past ``max_events`` answers, is
+    stored as a full record instead so replay cost stays bounded.
+    """
+
+    keeps_history = True
+    EVENTS, RECORD = b"E", b"R"
+
+    def __init__(
+        self,
+        replay: Callable[[str, bytes], Optional[Session]],
+        max_sessions: int = 50_000,
+        ttl_seconds: float = 3600.0,
+        hot_sessions: int = 1024,
+        max_events: int = 512,
+    ):
+        super().__init__(max_sessions, ttl_seconds)
+        self.replay = replay
+        self.hot_sessions = hot_sessions
+        self.max_events = max_events
+        self.replays = 0
+        self._hot: "OrderedDict[str, Session]" = OrderedDict()
+
+    def _warm(self, sid: str, st: Session) -> None:
+        self._hot[sid] = st
+        self._hot.move_to_end(sid)
+        while len(self._hot) > self.hot_sessions:
+            self._hot.popitem(last=False)
+
+    def get(self, sid: str) -> Optional[Session]:
+        now = time.monotonic()
+        with self._lock:
+            stored = self._live(sid, now)
+            if stored is None:
+                self._hot.pop(sid, None)
+                return None
+            st = self._hot.get(sid)
+            if st is not None:
+                self._hot.move_to_end(sid)
+                return st
+        if stored[:1] == self.EVENTS:
+            st = self.replay(sid, stored[1:])
+            self.replays += 1
+        else:
+            st = Session.from_bytes(sid, stored[1:])
+        if st is None:
+            return None
+        with self._lock:
+            # A put (or another get) may have landed while we replayed.
+            hot = self._hot.get(sid)
+            if hot is not None:
+                return hot
+            entry = self._data.get(sid)
+            if entry is not None and entry[1] is stored:
+                self._warm(sid, st)
+        return st
+
+    def put(self, sid: str, st: Session) -> None:
+        history = st.history
+        if history is not None and len(history) <= 4 + self.max_events:
+            stored = self.EVENTS + st.events()
+        else:
+            stored = self.RECORD + st.to_bytes()
+        now = time.monotonic()
+        sig = Census.signature(st, _ENTRY_BYTES + _BYTES_BYTES + len(stored))
+        with self._lock:
+            self._insert(sid, now, stored, sig)
+            self._sweep(now)
+            self._warm(sid, st)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            entry = self._data.pop(sid, None)
+            if entry is not None:
+                self.census.remove(entry[2])
+            self._hot.pop(sid, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "hot": len(self._hot), "replays": self.replays}
+
+class JournaledSessionStore(MemorySessionStore):
+    """``MemorySessionStore`` that survives restarts and crashes.
+
+    Every ``put``/``delete`` is encoded on the calling thread and queued; a
+    background writer appends whatever has queued up with one write and one
+    fsync per ``commit_interval`` (group commit), so requests never wait on
+    the disk and a crash loses at most that window. Once a journal segment
+    holds ``snapshot_every`` records the writer starts a new segment and
+    dumps the live sessions to a snapshot; on startup the newest snapshot is
+    loaded and the segments from it onwards are replayed.
+
+    ``path`` is a directory owned by one process (it is flock'd); ``touch``
+    is not journaled, so a recovered session's idle clock restarts from its
+    last write.
+    """
+
+    PUT, DELETE = 1, 2
+    SNAPSHOT_MAGIC = b"WPSS"
+    # crc32 of the rest, op, wall-clock time written, len(sid), len(record)
+    _RECORD = struct.Struct("<IBdHI")
+    _SNAPSHOT_HEADER = struct.Struct("<4sI")  # magic, generation
+
+    def __init__(
+        self,
+        path: str,
+        max_sessions: int = 50_000,
+        ttl_seconds: float = 3600.0,
+        snapshot_every: int = 100_000,
+        commit_interval: float = 0.02,
+    ):
+        super().__init__(max_sessions, ttl_seconds)
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.commit_interval = commit_interval
+        os.makedirs(path, exist_ok=True)
+        self._dir_lock = open(os.path.join(path, "lock"), "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._dir_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise RuntimeError(f"session journal {path!r} is in use by another process") from None
+
+        self._queue: Deque[bytes] = deque()
+        self.written_bytes = 0
+        self.logical_bytes = 0
+        t0 = time.perf_counter()
+        replayed = self._recover()
+        self.recovered = len(self._data)
+        self.recovery_seconds = time.perf_counter() - t0
+
+        gens = self._generations("journal-") + self._generations("snapshot-")
+        self._gen = max(gens) + 1 if gens else 0
+        # A long replay counts towards the next snapshot, so it isn't repeated.
+        self._segment_records = replayed
+        self._journal = open(self._file("journal-", self._gen), "ab")
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="session-journal", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # ----- files -----
+    def _file(self, prefix: str, gen: int) -> str:
+        return os.path.join(self.path, f"{prefix}{gen:08d}")
+
+    def _generations(self, prefix: str) -> List[int]:
+        return sorted(
+            int(name[len(prefix):]) for name in os.listdir(self.path)
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        )
+
+    def _encode(self, op: int, sid: str, wall: float, record: bytes) -> bytes:
+        key = sid.encode("utf-8")
+        body = self._RECORD.pack(0, op, wall, len(key), len(record))[4:] + key + record
+        return struct.pack("<I", zlib.crc32(body)) + body
+
+    def _records(self, data: bytes, pos: int = 0) -> Iterator[Tuple[int, str, float, bytes]]:
+        """Decode records until the end or the first torn/corrupt one."""
+        size = self._RECORD.size
+        while pos + size <= len(data):
+            crc, op, wall, n_key, n_rec = self._RECORD.unpack_from(data, pos)
+            end = pos + size + n_key + n_rec
+            if end > len(data) or zlib.crc32(data[pos + 4:end]) != crc:
+                return
+            key_end = pos + size + n_key
+            yield op, data[pos + size:key_end].decode("utf-8"), wall, data[key_end:end]
+            pos = end
+
+    # ----- recovery -----
+    def _recover(self) -> int:
+        """Load the newest snapshot and replay the journal after it; returns
+        the number of journal records replayed."""
+        for name in os.listdir(self.path):
+            if name.endswith(".tmp"):  # a snapshot cut short by a crash
+                os.unlink(os.path.join(self.path, name))
+        replayed = 0
+        snapshots = self._generations("snapshot-")
+        start = snapshots[-1] if snapshots else -1
+        entries: Dict[str, Tuple[float, bytes]] = {}
+        if start >= 0:
+            with open(self._file("snapshot-", start), "rb") as f:
+                data = f.read()
+            magic, _ = self._SNAPSHOT_HEADER.unpack_from(data)
+            if magic != self.SNAPSHOT_MAGIC:
+                raise ValueError(f"{self._file('snapshot-', start)} is not a session snapshot")
+            for _, sid, wall, record in self._records(data, self._SNAPSHOT_HEADER.size):
+                entries[sid] = (wall, record)
+        for gen in self._generations("journal-"):
+            if gen < start:
+                continue
+            with open(self._file("journal-", gen), "rb") as f:
+                for op, sid, wall, record in self._records(f.read()):
+                    replayed += 1
+                    if op == self.PUT:
+                        entries[sid] = (wall, record)
+                    else:
+                        entries.pop(sid, None)
+
+        # Rebuild in recency order, mapping wall-clock times onto monotonic.
+        now, wall_now = time.monotonic(), time.time()
+        for sid, (wall, record) in sorted(entries.items(), key=lambda item: item[1][0]):
+            age = wall_now - wall
+            if age <= self.ttl_seconds:
+                st = Session.from_bytes(sid, record)
+                self._insert(sid, now - age, st, Census.signature(st, _ENTRY_BYTES + st.approx_bytes()))
+        while len(self._data) > self.max_sessions:
+            self.census.remove(self._data.popitem(last=False)[1][2])
+        return replayed
+
+    # ----- writes -----
+    def put(self, sid: str, st: Session) -> None:
+        record = self._encode(self.PUT, sid, time.time(), st.to_bytes())
+        super().put(sid, st)
+        self._queue.append(record)
+
+    def delete(self, sid: str) -> None:
+        super().delete(sid)
+        self._queue.append(self._encode(self.DELETE, sid, time.time(), b""))
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(self.commit_interval):
+            self._commit()
+        self._commit()
+
+    def _commit(self) -> None:
+        queue, batch = self._queue, []
+        while queue:
+            batch.append(queue.popleft())
+        if batch:
+            data = b"".join(batch)
+            self._journal.write(data)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self.written_bytes += len(data)
+            self.logical_bytes += sum(self._RECORD.unpack_from(r)[4] for r in batch)
+            self._segment_records += len(batch)
+        if self._segment_records >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        """Start a new journal segment and snapshot the sessions it starts from.
+
+        Runs on the writer thread. Sessions are captured after the switch, so
+        anything written meanwhile is in the new segment and replays on top.
+        """
+        self._journal.close()
+        self._gen += 1
+        self._segment_records = 0
+        self._journal = open(self._file("journal-", self._gen), "ab")
+
+        with self._lock:
+            items = list(self._data.items())
+        now, wall_now = time.monotonic(), time.time()
+        path = self._file("snapshot-", self._gen)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._SNAPSHOT_HEADER.pack(self.SNAPSHOT_MAGIC, self._gen))
+            for sid, (touched, st, _) in items:
+                record = self._encode(self.PUT, sid, wall_now - (now - touched), st.to_bytes())
+                f.write(record)
+                self.written_bytes += len(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for prefix in ("journal-", "snapshot-"):
+            for gen in self._generations(prefix):
+                if gen < self._gen:
+                    os.unlink(self._file(prefix, gen))
+
+    def close(self) -> None:
+        if not self._stop.is_set():
+            self._stop.set()
+            self._writer.join()
+            self._journal.close()
+            self._dir_lock.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "recovered": self.recovered,
+            "recovery_seconds": round(self.recovery_seconds, 3),
+            "journal_generation": self._gen,
+            "journal_pending": len(self._queue),
+            "journal_written_bytes": self.written_bytes,
+            "journal_logical_bytes": self.logical_bytes,
+        }
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite database in WAL mode, shareable between workers.
+
+    Each thread gets its own connection. TTL expiry and the size cap are
+    enforced by a sweep every ``sweep_every`` writes rather than per request.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_sessions: int = 50_000,
+        ttl_seconds: float = 3600.0,
+        sweep_every: int = 1000,
+    ):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.sweep_every = sweep_every
+        self.lock_path = path + ".locks"
+        self._writes = 0
+        self._local = threading.local()
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY, touched REAL NOT NULL, state BLOB NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched)")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, sid: str) -> Optional[Session]:
+        now = time.time()
+        db = self._db()
+        row = db.execute("SELECT touched, state FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None:
+            return None
+        if now - row[0] > self.ttl_seconds:
+            db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+            self.expired += 1
+            return None
+        db.execute("UPDATE sessions SET touched = ? WHERE sid = ?", (now, sid))
+        return Session.from_bytes(sid, row[1])
+
+    def touch(self, sid: str) -> bool:
+        now = time.time()
+        cur = self._db().execute(
+            "UPDATE sessions SET touched = ? WHERE sid = ? AND touched >= ?",
+            (now, sid, now - self.ttl_seconds),
+        )
+        return cur.rowcount > 0
+
+    def put(self, sid: str, st: Session) -> None:
+        self._db().execute(
+            "INSERT OR REPLACE INTO sessions (sid, touched, state) VALUES (?, ?, ?)",
+            (sid, time.time(), st.to_bytes()),
+        )
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            self.sweep()
+
+    def delete(self, sid: str) -> None:
+        self._db().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def sweep(self) -> None:
+        db = self._db()
+        cur = db.execute("DELETE FROM sessions WHERE touched < ?", (time.time() - self.ttl_seconds,))
+        self.expired += max(cur.rowcount, 0)
+        over = len(self) - self.max_sessions
+        if over > 0:
+            cur = db.execute(
+                "DELETE FROM sessions WHERE sid IN"
+                " (SELECT sid FROM sessions ORDER BY touched LIMIT ?)",
+                (over,),
+            )
+            self.evicted += max(cur.rowcount, 0)
+
+    def __len__(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._db().execute(
+            "SELECT sid FROM sessions WHERE touched >= ?", (time.time() - self.ttl_seconds,)
+        ).fetchall()
+        return (row[0] for row in rows)
+
+class SharedMemorySessionStore(SessionStore):
+    """Fixed-size session table in a memory-mapped file shared by every worker.
+
+    The table is set-associative: a session id (a UUID) hashes to a set of
+    ``ways`` slots, and a full set evicts its least recently touched slot, so
+    the table never grows past ``max_sessions``. Access is serialized across
+    processes with ``flock`` on the mapped file.
+
+    A record too big for its slot (a long session on a very large deck)
+    goes to a file of its own in ``path + ".spill"``; the slot keeps its
+    key, touch time and ``SPILLED`` as the length, and the file is removed
+    whenever the slot is freed or reused.
+    """
+
+    MAGIC = b"WPS5"
+    _FILE_HEADER = struct.Struct("<4sIII")  # magic, sets, ways, slot_size
+    _SLOT_HEADER = struct.Struct("<16sdH")  # uuid bytes, touched, record length
+    SPILLED = 0xFFFF
+
+    def __init__(
+        self,
+        path: str,
+        max_sessions: int = 50_000,
+        ttl_seconds: float = 3600.0,
+        ways: int = 8,
+        slot_size: int = 2048,
+    ):
+        if fcntl is None:
+            raise RuntimeError("SharedMemorySessionStore needs fcntl (POSIX)")
+        self.path = path
+        self.lock_path = path + ".locks"
+        self.ways = ways
+        self.sets = max(1, -(-max_sessions // ways))
+        self.max_sessions = self.sets * ways
+        self.ttl_seconds = ttl_seconds
+        self.slot_size = slot_size
+        self.spill_path = path + ".spill"
+        self.spilled = 0
+        self._lock = threading.Lock()
+        size = self._FILE_HEADER.size + self.max_sessions * slot_size
+        expected = self._FILE_HEADER.pack(self.MAGIC, self.sets, ways, slot_size)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size or os.pread(self._fd, len(expected), 0) != expected:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, expected, 0)
+                shutil.rmtree(self.spill_path, ignore_errors=True)
+            os.makedirs(self.spill_path, mode=0o700, exist_ok=True)
+            self._map = mmap.mmap(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def default_path() -> str:
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        return os.path.join(base, "word-psychic-sessions")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _slots(self, key: bytes) -> range:
+        first = (int.from_bytes(key[:8], "little") % self.sets) * self.ways
+        return range(first, first + self.ways)
+
+    def _offset(self, slot: int) -> int:
+        return self._FILE_HEADER.size + slot * self.slot_size
+
+    def _spill_file(self, key: bytes) -> str:
+        return os.path.join(self.spill_path, key.hex())
+
+    def _free(self, key: bytes, length: int) -> None:
+        """Drop the spill file of a slot holding ``key`` that is being freed."""
+        if length == self.SPILLED:
+            try:
+                os.unlink(self._spill_file(key))
+            except FileNotFoundError:
+                pass
+
+    def _find(self, key: bytes, now: float) -> Tuple[Optional[int], int]:
+        """Return (slot holding ``key`` or None, best slot to overwrite)."""
+        victim, victim_touched = -1, float("inf")
+        for slot in self._slots(key):
+            skey, touched, length = self._SLOT_HEADER.unpack_from(self._map, self._offset(slot))
+            if length and now - touched > self.ttl_seconds:
+                self._free(skey, length)
+                self._SLOT_HEADER.pack_into(self._map, self._offset(slot), b"", 0.0, 0)
+                self.expired += 1
+                length, touched = 0, 0.0
+            if length and skey == key:
+                return slot, slot
+            if not length:
+                touched = -1.0
+            if touched < victim_touched:
+                victim, victim_touched = slot, touched
+        return None, victim
+
+    @staticmethod
+    def _key(sid: str) -> Optional[bytes]:
+        try:
+            return UUID(sid).bytes
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def get(self, sid: str) -> Optional[Session]:
+        key = self._key(sid)
+        if key is None:
+            return None
+        now = time.time()
+        with self._locked():
+            slot, _ = self._find(key, now)
+            if slot is None:
+                return None
+            off = self._offset(slot)
+            length = self._SLOT_HEADER.unpack_from(self._map, off)[2]
+            self._SLOT_HEADER.pack_into(self._map, off, key, now, length)
+            if length == self.SPILLED:
+                try:
+                    with open(self._spill_file(key), "rb") as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    return None
+            else:
+                start = off + self._SLOT_HEADER.size
+                data = self._map[start:start + length]
+        return Session.from_bytes(sid, data)
+
+    def touch(self, sid: str) -> bool:
+        key = self._key(sid)
+        if key is None:
+            return False
+        now = time.time()
+        with self._locked():
+            slot, _ = self._find(key, now)
+            if slot is None:
+                return False
+            off = self._offset(slot)
+            length = self._SLOT_HEADER.unpack_from(self._map, off)[2]
+            self._SLOT_HEADER.pack_into(self._map, off, key, now, length)
+            return True
+
+    def put(self, sid: str, st: Session) -> None:
+        key = self._key(sid)
+        if key is None:
+            raise ValueError(f"shared-memory sessions need UUID session ids, got {sid!r}")
+        room = self.slot_size - self._SLOT_HEADER.size
+        data = st.to_bytes()
+        if len(data) > room:
+            data = st.to_bytes(with_reply=False)
+        spill = len(data) > room
+        if spill:
+            data = st.to_bytes()
+        now = time.time()
+        with self._locked():
+            slot, victim = self._find(key, now)
+            if slot is None:
+                slot = victim
+            off = self._offset(slot)
+            old_key, _, old_length = self._SLOT_HEADER.unpack_from(self._map, off)
+            if old_length and old_key != key:
+                self.evicted += 1
+            if spill:
+                tmp = self._spill_file(key) + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, self._spill_file(key))
+                self.spilled += 1
+                if old_key != key:
+                    self._free(old_key, old_length)
+                self._SLOT_HEADER.pack_into(self._map, off, key, now, self.SPILLED)
+                return
+            self._free(old_key, old_length)
+            self._SLOT_HEADER.pack_into(self._map, off, key, now, len(data))
+            start = off + self._SLOT_HEADER.size
+            self._map[start:start + len(data)] = data
+
+    def delete(self, sid: str) -> None:
+        key = self._key(sid)
+        if key is None:
+            return
+        with self._locked():
+            slot, _ = self._find(key, time.time())
+            if slot is not None:
+                self._free(key, self._SLOT_HEADER.unpack_from(self._map, self._offset(slot))[2])
+                self._SLOT_HEADER.pack_into(self._map, self._offset(slot), b"", 0.0, 0)
+
+    def __iter__(self) -> Iterator[str]:
+        now = time.time()
+        live = []
+        with self._locked():
+            for slot in range(self.max_sessions):
+                key, touched, length = self._SLOT_HEADER.unpack_from(self._map, self._offset(slot))
+                if length and now - touched <= self.ttl_seconds:
+                    live.append(str(UUID(bytes=key)))
+        return iter(live)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "spilled": self.spilled}
+
+class AsyncSessionStore:
+    """Awaitable view of a ``SessionStore``.
+
+    Non-blocking stores are called inline on the event loop; blocking ones
+    are pushed to a worker thread so they never stall it.
+    """
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.store.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, sid: str) -> Optional[Session]:
+        return await self._call(self.store.get, sid)
+
+    async def put(self, sid: str, st: Session) -> None:
+        await self._call(self.store.put, sid, st)
+
+    async def touch(self, sid: str) -> bool:
+        return await self._call(self.store.touch, sid)
+
+    async def delete(self, sid: str) -> None:
+        await self._call(self.store.delete, sid)
+
+    async def stats(self) -> Dict[str, Any]:
+        return await self._call(self.store.stats)
+
+# ---------- Session ids ----------
+def load_secret(path: str) -> bytes:
+    """Read a shared secret from ``path``, creating it on first use so every
+    worker and restart agrees; falls back to a per-process secret if the
+    file can't be written."""
+    for _ in range(2):
+        try:
+            with open(path, "rb") as f:
+                secret = f.read()
+            if len(secret) >= 16:
+                return secret
+        except FileNotFoundError:
+            pass
+        except OSError:
+            break
+        secret = os.urandom(32)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+            with os.fdopen(fd, "wb") as f:
+                f.write(secret)
+            try:
+                os.link(tmp, path)  # atomic create-if-absent, content included
+                return secret
+            except FileExistsError:
+                continue  # another worker won; read theirs
+            finally:
+                os.unlink(tmp)
+        except OSError:
+            break
+    return os.urandom(32)
+
+class SessionIds:
+    """Self-authenticating session ids.
+
+    An id is formatted like a UUID but holds 8 random bytes and an 8-byte
+    truncated HMAC-SHA256 of them, so forged, mistyped or foreign ids are
+    refused by ``valid`` without touching the store.
+    """
+
+    def __init__(self, secret: bytes):
+        self._secret = secret
+
+    def _tag(self, nonce: bytes) -> bytes:
+        return hmac.new(self._secret, nonce, hashlib.sha256).digest()[:8]
+
+    def new(self) -> str:
+        nonce = os.urandom(8)
+        return str(UUID(bytes=nonce + self._tag(nonce)))
+
+    def valid(self, sid: Any) -> bool:
+        if type(sid) is str and len(sid) == 36:
+            try:
+                raw = bytes.fromhex(sid.replace("-", ""))
+            except ValueError:
+                raw = b""
+            if len(raw) == 16 and hmac.compare_digest(raw[8:], self._tag(raw[:8])):
+                return True
+        return False
+
+# ---------- Stateless tokens ----------
+class SessionTokens:
+    """Encode a whole session into an HMAC-signed, URL-safe token.
+
+    Layout before base64: version byte, issue time (uint32 seconds), the
+    session's ``log_key`` (uint64), the ``Session.to_bytes`` record, then a
+    16-byte truncated HMAC-SHA256 tag. Tokens older than ``ttl_seconds`` are
+    refused, like idle sessions.
+    """
+
+    VERSION = 5
+    TAG_SIZE = 16
+    _PREFIX = struct.Struct("<BIQ")
+
+    def __init__(self, secret: bytes, ttl_seconds: float = 3600.0):
+        if not secret:
+            raise ValueError("stateless sessions need a non-empty secret")
+        self._secret = secret
+        self.ttl_seconds = ttl_seconds
+
+    def _tag(self, body: bytes) -> bytes:
+        return hmac.new(self._secret, body, hashlib.sha256).digest()[: self.TAG_SIZE]
+
+    def encode(self, st: Session) -> str:
+        body = self._PREFIX.pack(self.VERSION, int(time.time()), st.log_key()) + st.to_bytes(with_reply=False)
+        return base64.urlsafe_b64encode(body + self._tag(body)).rstrip(b"=").decode("ascii")
+
+    def decode(self, token: str) -> Optional[Session]:
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (ValueError, TypeError):
+            return None
+        body, tag = raw[: -self.TAG_SIZE], raw[-self.TAG_SIZE :]
+        if len(body) < self._PREFIX.size or not hmac.compare_digest(tag, self._tag(body)):
+            return None
+        version, issued, key = self._PREFIX.unpack_from(body)
+        if version != self.VERSION or time.time() - issued > self.ttl_seconds:
+            return None
+        try:
+            st = Session.from_bytes(token, body[self._PREFIX.size :])
+        except (struct.error, ValueError):
+            return None
+        st.key = key
+        return st
+
+def make_store(
+    backend: str = "memory",
+    path: Optional[str] = None,
+    max_sessions: int = 50_000,
+    ttl_seconds: float = 3600.0,
+    replay: Optional[Callable[[str, bytes], Optional[Session]]] = None,
+) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore(max_sessions, ttl_seconds)
+    if backend == "events":
+        if replay is None:
+            raise ValueError("the events backend needs a replay function")
+        return EventSourcedSessionStore(replay, max_sessions, ttl_seconds)
+    if backend == "journal":
+        return JournaledSessionStore(path or "sessions-journal", max_sessions, ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteSessionStore(path or "sessions.db", max_sessions, ttl_seconds)
+    if backend == "shm":
+        return SharedMemorySessionStore(path or SharedMemorySessionStore.default_path(), max_sessions, ttl_seconds)
+    raise ValueError(f"unknown session backend {backend!r} (expected memory, events, journal, sqlite or shm)")
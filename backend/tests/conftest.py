@@ -0,0 +1,5 @@
+# The backend modules import each other as siblings (run from backend/).
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
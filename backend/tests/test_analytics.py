@@ -0,0 +1,103 @@
+import collections
+import os
+import random
+import tempfile
+import unittest
+
+import analytics
+import engine
+from eventlog import HEADER, RECORD, TransitionLog, log_files, read
+from sessions import Phase
+
+def write_log(path, sessions, answers):
+    log = TransitionLog(path)
+    rng = random.Random(5)
+    for n in range(sessions):
+        st = engine.new_session("s%d" % n, seed=n)
+        for _ in range(200):
+            a = engine.normalize(rng.choice(answers(st)))
+            before = st.phase
+            out = engine.advance(st, a)
+            log.record(st.log_key(), st.pack, before, st.phase, engine.ANSWER_CLASSES.get(a, engine.OTHER),
+                       st.current_idx)
+            if out.done:
+                break
+    log.close()
+
+def split(path, into, parts):
+    """Copy the one log under ``path`` into ``parts`` files, as rotation
+    would, so sessions straddle files."""
+    with open(log_files(path)[0], "rb") as f:
+        header, data = f.read(HEADER.size), f.read()
+    count = len(data) // RECORD.size
+    os.makedirs(into)
+    for n in range(parts):
+        chunk = data[n * count // parts * RECORD.size:(n + 1) * count // parts * RECORD.size]
+        with open(os.path.join(into, "transitions-%04d.wpl" % n), "wb") as f:
+            f.write(header + chunk)
+
+def mixed(st):
+    if st.phase == Phase.AWAIT_CONTINUE:
+        return ["yes", "no", "no", "maybe"]
+    return ["yes"] * 12 + ["no", "x"]
+
+@unittest.skipIf(analytics.np is None, "needs NumPy")
+class Funnel(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_no_offers(self):
+        write_log(self.path("log"), 20, lambda st: ["no"])
+        rep = analytics.report(self.path("log"))
+        self.assertEqual((rep["transitions"], rep["sessions"], rep["clusters"]), (20, 20, []))
+        self.assertEqual(rep["phases"]["done"]["ended"], 20)
+
+    def test_rotated_files_match_one_file(self):
+        write_log(self.path("single"), 300, mixed)
+        split(self.path("single"), self.path("rotated"), 7)
+        self.assertEqual(len(log_files(self.path("rotated"))), 7)
+        self.assertEqual(analytics.report(self.path("rotated"), top=0), analytics.report(self.path("single"), top=0))
+
+    def test_matches_a_recount(self):
+        write_log(self.path("single"), 300, mixed)
+        split(self.path("single"), self.path("log"), 5)
+        rep = analytics.report(self.path("log"), top=0)
+
+        offers, accepted = collections.Counter(), collections.Counter()
+        pairs = collections.defaultdict(lambda: [0, False, False])
+        phases = collections.defaultdict(list)
+        for key, ts, cluster, pack, before, after, _ in sorted(read(self.path("log")), key=lambda r: r[:2]):
+            phases[key].append((before, after))
+            at = (key, pack, cluster)
+            if after == Phase.AWAIT_CONTINUE and before != Phase.AWAIT_CONTINUE:
+                offers[pack, cluster] += 1
+                pairs[at][0] += 1
+            if before == Phase.AWAIT_CONTINUE and after == Phase.DECLINE_CONFIRM:
+                pairs[at][1] = True
+            if before == Phase.AWAIT_CONTINUE and after == Phase.POST_REVEAL:
+                accepted[pack, cluster] += 1
+                pairs[at][2] = True
+        reoffered, converted = collections.Counter(), collections.Counter()
+        for (_, pack, cluster), (n, declined, accept) in pairs.items():
+            reoffered[pack, cluster] += declined and n > 1
+            converted[pack, cluster] += declined and accept
+
+        self.assertEqual(rep["sessions"], len(phases))
+        for row in rep["clusters"]:
+            at = row["pack"], row["cluster"]
+            self.assertEqual(
+                (row["offers"], row["accepted"], row["reoffered"], row["converted"]),
+                (offers[at], accepted[at], reoffered[at], converted[at]),
+            )
+        ended = collections.Counter(steps[-1][1] for steps in phases.values())
+        reached = collections.Counter(p for steps in phases.values() for p in {steps[0][0], *(a for _, a in steps)})
+        for phase in Phase:
+            row = rep["phases"][phase.name.lower()]
+            self.assertEqual((row["reached"], row["ended"]), (reached[phase], ended[phase]))
+
+if __name__ == "__main__":
+    unittest.main()
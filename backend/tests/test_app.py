@@ -0,0 +1,127 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+import uuid
+
+os.environ.setdefault("WP_SID_SECRET", "test-secret")
+
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import app
+import engine
+from sessions import SessionIds
+
+CLIENT = TestClient(app.app)
+
+def start():
+    return CLIENT.get("/start").json()["session_id"]
+
+def choose(sid, answer="yes", **body):
+    return CLIENT.post("/choose", json={"answer": answer, "context": {"session_id": sid}, **body})
+
+# Posts every body in BAD_BODIES to /choose and prints [status, json] for each.
+POST_BAD_BODIES = textwrap.dedent("""
+    import json, sys
+    from fastapi.testclient import TestClient
+    import app
+
+    client = TestClient(app.app)
+    out = []
+    for content_type, body in json.loads(sys.argv[1]):
+        r = client.post("/choose", content=body.encode(), headers={"content-type": content_type})
+        out.append([r.status_code, r.json()])
+    print(json.dumps(out))
+""")
+
+JSON = "application/json"
+BAD_BODIES = [
+    (JSON, json.dumps({"context": {}})),
+    (JSON, json.dumps({"answer": 5})),
+    (JSON, ""),
+    (JSON, '{"answer": '),
+    (JSON, "[1, 2]"),
+    ("application/x-www-form-urlencoded", "answer=yes"),
+    (JSON, json.dumps({"answer": "yes", "context": {"session_id": {"nested": 1}}})),
+    (JSON, json.dumps({"answer": "y" * 65})),
+    (JSON, json.dumps({"answer": "yes", "seq": 0})),
+]
+
+class ValidationErrors(unittest.TestCase):
+    def post_bad_bodies(self, async_handlers):
+        env = {**os.environ, "WP_ASYNC_HANDLERS": async_handlers}
+        out = subprocess.run(
+            [sys.executable, "-c", POST_BAD_BODIES, json.dumps(BAD_BODIES)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        return json.loads(out)
+
+    def test_fast_path_matches_fastapi(self):
+        fast, model = self.post_bad_bodies("1"), self.post_bad_bodies("0")
+        for body, got, want in zip(BAD_BODIES, fast, model):
+            self.assertEqual(got, want, body)
+            self.assertEqual(got[0], 422, body)
+
+class ReplyTemplates(unittest.TestCase):
+    def test_templates_match_json_response(self):
+        sid = app.SESSION_IDS.new()
+        for text, done in engine.static_replies(engine.ACTIVE):
+            out = engine.Reply(text, done)
+            want = JSONResponse({"text": text, "done": done, "context": {"session_id": sid}}).body
+            self.assertEqual(app.reply_response(out, sid).body, want, text)
+
+def mistype(sid):
+    return sid[:-1] + ("0" if sid[-1] != "0" else "1")
+
+class SessionIdChecks(unittest.TestCase):
+    def rejected(self):
+        return app.METRICS.collect()[0].get(("wp_rejected_ids_total", ()), 0)
+
+    def test_bad_ids_are_refused(self):
+        ids = SessionIds(b"secret")
+        sid = ids.new()
+        self.assertTrue(ids.valid(sid))
+        for bad in (str(uuid.uuid4()), mistype(sid), SessionIds(b"other").new(), sid.upper().replace("-", "x"),
+                    sid[:-1], "", None, 42):
+            self.assertFalse(ids.valid(bad), bad)
+
+    def test_bad_ids_expire_and_are_counted(self):
+        live = start()
+        before = self.rejected()
+        for bad in (str(uuid.uuid4()), mistype(live), SessionIds(b"other").new(), "not-a-session"):
+            out = choose(bad)
+            self.assertEqual(out.status_code, 200)
+            self.assertEqual(out.json(), {
+                "text": engine.ACTIVE.lines["session_expired"],
+                "done": True,
+                "expired": True,
+                "context": {"session_id": None},
+            })
+        self.assertEqual(self.rejected(), before + 4)
+        self.assertIn("wp_rejected_ids_total %d" % (before + 4), CLIENT.get("/metrics").text)
+        self.assertEqual(CLIENT.get("/stats").json()["rejected_ids"], before + 4)
+
+    def test_unknown_valid_id_expires_without_counting(self):
+        before = self.rejected()
+        self.assertTrue(choose(app.SESSION_IDS.new()).json()["expired"])
+        self.assertEqual(self.rejected(), before)
+        self.assertFalse(choose(start()).json()["done"])
+
+class SeqBounds(unittest.TestCase):
+    def test_out_of_range_seq_is_refused(self):
+        sid = start()
+        self.assertEqual(choose(sid, seq=1).status_code, 200)
+        for seq in (0, -1, 2**32):
+            self.assertEqual(choose(sid, "no", seq=seq).status_code, 422, seq)
+
+    def test_largest_seq_is_remembered(self):
+        sid = start()
+        first = choose(sid, seq=2**32 - 1).json()
+        self.assertEqual(choose(sid, "no", seq=2**32 - 1).json(), first)
+
+if __name__ == "__main__":
+    unittest.main()
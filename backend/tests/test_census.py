@@ -0,0 +1,68 @@
+import collections
+import random
+import tempfile
+import time
+import unittest
+
+import engine
+from sessions import REVEALED_CAP, EventSourcedSessionStore, JournaledSessionStore, MemorySessionStore, Phase
+
+class CensusRecount(unittest.TestCase):
+    def check(self, store, live):
+        """``store.census`` against a recount of ``live`` (sid -> Session)."""
+        report = store.census.report()
+        phases = collections.Counter(st.phase for st in live.values())
+        revealed = collections.Counter(min(len(st.revealed), REVEALED_CAP) for st in live.values())
+        self.assertEqual(report["live"], len(live))
+        self.assertEqual(report["phases"], {phase.name.lower(): phases[phase] for phase in Phase})
+        self.assertEqual(
+            report["revealed"],
+            {(f"{n}+" if n == REVEALED_CAP else str(n)): count for n, count in sorted(revealed.items())},
+        )
+        self.assertEqual(report["approx_bytes"], sum(entry[2] >> 9 for entry in store._data.values()))
+
+    def exercise(self, store):
+        rng = random.Random(3)
+        live = collections.OrderedDict()
+        sessions = {}
+
+        def put(sid):
+            st = sessions.setdefault(sid, engine.new_session(sid, seed=len(sessions), history=True))
+            engine.advance(st, rng.choice(("yes", "yes", "no", "huh")))
+            store.put(sid, st)
+            live[sid] = st
+            live.move_to_end(sid)
+            while len(live) > store.max_sessions:
+                live.popitem(last=False)
+
+        for n in range(300):
+            put("s%d" % rng.randrange(60))
+            if rng.random() < 0.2 and live:
+                sid = rng.choice(list(live))
+                store.delete(sid)
+                del live[sid]
+        self.check(store, live)
+
+        time.sleep(store.ttl_seconds * 1.5)
+        live.clear()
+        put("fresh")
+        self.check(store, live)
+        self.assertGreater(store.expired, 0)
+        self.assertGreater(store.evicted, 0)
+
+    def test_memory(self):
+        self.exercise(MemorySessionStore(max_sessions=40, ttl_seconds=0.2))
+
+    def test_events(self):
+        self.exercise(EventSourcedSessionStore(engine.replay, max_sessions=40, ttl_seconds=0.2))
+
+    def test_journal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = JournaledSessionStore(tmp, max_sessions=40, ttl_seconds=0.2)
+            try:
+                self.exercise(store)
+            finally:
+                store.close()
+
+if __name__ == "__main__":
+    unittest.main()
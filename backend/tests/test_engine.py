@@ -0,0 +1,151 @@
+"""Golden transcript of the conversation engine.
+
+``golden_transcript.json.gz`` holds every reply of a fixed set of seeded
+sessions answering a fixed random mix. Any change to what a session says or
+in what order is a failure here; when the change is intended, regenerate the
+fixture from ``backend/`` with
+``PYTHONPATH=. python tests/test_engine.py --regenerate``. The fixture is
+written by ``legacy_advance``, the if-chain the transition table replaced,
+and both must reproduce it.
+"""
+import gzip
+import json
+import os
+import random
+import sys
+import unittest
+
+import engine
+from engine import (
+    Phase,
+    choose_another_word,
+    choose_decline_confirm,
+    choose_goodbye,
+    choose_invalid_yn,
+    choose_invalid_yne,
+    closing_block,
+    content,
+    guidance_flow,
+    offer_next_word,
+    reply,
+)
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_transcript.json.gz")
+SESSIONS = 300
+ANSWERS = ["yes", "yes", "yes", "no", "no", "y", "N", "maybe", "", "quit", "stop", "end"]
+
+def legacy_advance(st, a):
+    """``choose()`` before the transition table, with the text helpers taking
+    the session; ``bench.py dispatch`` times it against ``engine.advance``."""
+    if a in {"quit", "stop"}:
+        st.phase = Phase.DONE
+        return reply(st, closing_block(st), done=True)
+
+    if st.phase == Phase.INTRO:
+        if a == "yes":
+            st.first_offer_done = False
+            return offer_next_word(st)
+        if a == "no":
+            st.phase = Phase.DONE
+            return reply(st, choose_goodbye(st), done=True)
+        return reply(st, choose_invalid_yn(st))
+
+    if st.phase == Phase.AWAIT_CONTINUE:
+        idx = st.current_idx
+
+        if a == "yes":
+            if idx < 0:
+                st.phase = Phase.DONE
+                return reply(st, content(st).lines["spirits_quiet"], done=True)
+
+            st.revealed.append(idx)
+            st.first_offer_done = True
+            st.short_hint_shown = False
+
+            st.phase = Phase.POST_REVEAL
+            another = choose_another_word(st)
+            g = guidance_flow(st, opening=False)
+
+            tail = f"\n\n{another}" + (f"\n{g}" if g else "")
+            return reply(st, content(st).clusters.script(idx) + "\n\n" + tail)
+
+        if a == "no":
+            if idx >= 0:
+                st.reject(idx)
+
+            st.first_offer_done = True
+            st.phase = Phase.DECLINE_CONFIRM
+            st.short_hint_shown = False
+            return reply(st, choose_decline_confirm(st))
+
+        return reply(st, choose_invalid_yne(st))
+
+    if st.phase == Phase.DECLINE_CONFIRM:
+        if a == "yes":
+            return offer_next_word(st)
+        if a == "no":
+            st.phase = Phase.DONE
+            return reply(st, closing_block(st), done=True)
+        return reply(st, choose_invalid_yne(st))
+
+    if st.phase == Phase.POST_REVEAL:
+        if a == "yes":
+            return offer_next_word(st)
+        if a == "no":
+            st.phase = Phase.DONE
+            return reply(st, closing_block(st), done=True)
+        return reply(st, choose_invalid_yne(st))
+
+    if st.phase == Phase.REOFFER_PROMPT:
+        if a == "yes":
+            st.reoffer_rejected()
+            st.first_offer_done = True
+            return offer_next_word(st)
+
+        st.phase = Phase.DONE
+        lines = content(st).lines
+        text = lines["asked_twice"] if st.reoffer_attempts >= 2 else lines["session_complete"]
+        if st.revealed:
+            text = closing_block(st)
+        return reply(st, text, done=True)
+
+    st.phase = Phase.DONE
+    return reply(st, content(st).lines["spirits_quiet"], done=True)
+
+def transcript(advance=engine.advance):
+    """[seed, answer, text, done] for every step of every session."""
+    rng = random.Random(42)
+    out = []
+    for seed in range(SESSIONS):
+        st = engine.new_session("s%d" % seed, seed=seed)
+        for n in range(200):
+            a = rng.choice(ANSWERS if n > 3 else ["yes", "no", "huh"])
+            r = advance(st, engine.normalize(a))
+            out.append([seed, a, r.text, r.done])
+            if r.done and rng.random() < 0.7:
+                break
+    return out
+
+def load_golden():
+    with gzip.open(GOLDEN, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+class GoldenTranscript(unittest.TestCase):
+    def assert_transcript(self, got):
+        want = load_golden()
+        self.assertEqual(len(got), len(want))
+        for i, (g, w) in enumerate(zip(got, want)):
+            self.assertEqual(g, w, f"step {i} (seed {w[0]})")
+
+    def test_transition_table(self):
+        self.assert_transcript(transcript())
+
+    def test_legacy_if_chain(self):
+        self.assert_transcript(transcript(legacy_advance))
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--regenerate"]:
+        with gzip.open(GOLDEN, "wt", encoding="utf-8") as f:
+            json.dump(transcript(legacy_advance), f, ensure_ascii=False, separators=(",", ":"))
+    else:
+        unittest.main()
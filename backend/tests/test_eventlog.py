@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+import engine
+from eventlog import read
+from sessions import SessionTokens
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Drives one stateless session to the end through the app.
+CLIENT = textwrap.dedent("""
+    from fastapi.testclient import TestClient
+    import app
+
+    client = TestClient(app.app)
+    sid = client.get("/start").json()["session_id"]
+    for seq in range(1, 200):
+        answer = ("yes", "no", "yes", "yes")[(seq - 1) % 4]
+        out = client.post("/choose", json={"answer": answer, "seq": seq, "context": {"session_id": sid}}).json()
+        sid = out["context"]["session_id"]
+        if out["done"]:
+            break
+    app.EVENT_LOG.close()
+""")
+
+class StatelessLogging(unittest.TestCase):
+    def test_key_survives_tokens(self):
+        tokens = SessionTokens(b"secret")
+        st = engine.new_session("first", seed=8)
+        key = st.log_key()
+        for answer in ("yes", "no", "yes", "yes", "no", "yes"):
+            engine.advance(st, answer)
+            st = tokens.decode(tokens.encode(st))
+            self.assertEqual(st.log_key(), key)
+
+    def test_one_key_per_stateless_session(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "WP_STATELESS": "1",
+                "WP_TOKEN_SECRET": "test-secret",
+                "WP_SID_SECRET": "test-secret",
+                "WP_EVENT_LOG": tmp,
+                "WP_RATE": "0",
+                "WP_SESSIONS_PER_CLIENT": "0",
+            }
+            subprocess.run([sys.executable, "-c", CLIENT], cwd=BACKEND, env=env, check=True)
+            records = list(read(tmp))
+        self.assertGreater(len(records), 3)
+        self.assertEqual(len({key for key, *_ in records}), 1)
+
+if __name__ == "__main__":
+    unittest.main()
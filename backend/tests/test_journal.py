@@ -0,0 +1,95 @@
+import os
+import random
+import tempfile
+import time
+import unittest
+
+import engine
+from sessions import JournaledSessionStore
+
+def session(n, answers):
+    st = engine.new_session("%036d" % n, seed=n)
+    for a in answers:
+        engine.advance(st, a)
+    return st
+
+class Recovery(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+
+    def open(self, **kw):
+        store = JournaledSessionStore(self.path, commit_interval=0.001, **kw)
+        self.addCleanup(store.close)
+        return store
+
+    def assert_recovered(self, store, want):
+        self.assertEqual(len(store), len(want))
+        for sid, st in want.items():
+            self.assertEqual(store.get(sid).to_bytes(), st.to_bytes(), sid)
+
+    def test_puts_and_deletes_survive_snapshots(self):
+        store = self.open(snapshot_every=10)
+        rng = random.Random(1)
+        want = {}
+        for batch in range(20):
+            for _ in range(8):
+                n = rng.randrange(40)
+                sid = "%036d" % n
+                if sid in want and rng.random() < 0.3:
+                    store.delete(sid)
+                    del want[sid]
+                else:
+                    want[sid] = session(n, rng.choices(["yes", "no", "maybe"], k=rng.randrange(6)))
+                    store.put(sid, want[sid])
+            time.sleep(0.005)  # let the writer commit (and snapshot) between batches
+        store.close()
+        self.assertTrue(any(name.startswith("snapshot-") for name in os.listdir(self.path)))
+
+        self.assert_recovered(self.open(), want)
+
+    def test_torn_tail_stops_replay(self):
+        store = self.open()
+        want = {}
+        for n in range(5):
+            want["%036d" % n] = session(n, ["yes", "no"][: n % 3])
+            store.put("%036d" % n, want["%036d" % n])
+        store.close()
+        (journal,) = [name for name in os.listdir(self.path) if name.startswith("journal-")]
+        journal = os.path.join(self.path, journal)
+        os.truncate(journal, os.path.getsize(journal) - 3)
+        del want["%036d" % 4]
+
+        store = self.open()
+        self.assert_recovered(store, want)
+        store.put("%036d" % 9, session(9, ["yes"]))
+        want["%036d" % 9] = session(9, ["yes"])
+        store.close()
+        self.assert_recovered(self.open(), want)
+
+    def test_corrupt_record_stops_replay(self):
+        store = self.open()
+        for n in range(3):
+            store.put("%036d" % n, session(n, ["yes"]))
+        store.close()
+        (journal,) = [name for name in os.listdir(self.path) if name.startswith("journal-")]
+        with open(os.path.join(self.path, journal), "r+b") as f:
+            data = bytearray(f.read())
+            data[-10] ^= 0xFF
+            f.seek(0)
+            f.write(data)
+        self.assert_recovered(self.open(), {"%036d" % n: session(n, ["yes"]) for n in range(2)})
+
+    def test_expired_sessions_are_not_recovered(self):
+        store = self.open()
+        store.put("%036d" % 1, session(1, ["yes"]))
+        store.close()
+        time.sleep(0.05)
+        store = self.open(ttl_seconds=0.02)
+        self.assertEqual(len(store), 0)
+        store.close()
+        self.assertEqual(len(self.open()), 1)
+
+if __name__ == "__main__":
+    unittest.main()
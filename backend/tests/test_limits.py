@@ -0,0 +1,121 @@
+import asyncio
+import unittest
+
+from limits import Admission, AdmissionMiddleware, BodyLimit, BodyLimitMiddleware, SessionQuota
+
+def scope(path, client="10.0.0.1"):
+    return {"type": "http", "path": path, "method": "GET", "client": (client, 5000), "headers": []}
+
+class LiveSessions(unittest.TestCase):
+    def test_quota_counts_live_sessions(self):
+        quota = SessionQuota(per_client=2, ttl=60)
+        quota.add(1, "a", 0)
+        quota.add(2, "a", 0)
+        self.assertTrue(quota.full("a", 1))
+        self.assertFalse(quota.full("b", 1))
+        quota.release(1)
+        quota.release(1)
+        self.assertFalse(quota.full("a", 1))
+
+    def test_idle_sessions_expire_touched_ones_do_not(self):
+        quota = SessionQuota(per_client=2, ttl=60)
+        quota.add(1, "a", 0)
+        quota.add(2, "a", 0)
+        quota.touch(2, 50)
+        self.assertFalse(quota.full("a", 61))
+        quota.add(3, "a", 61)
+        self.assertTrue(quota.full("a", 100))
+        self.assertFalse(quota.full("a", 122))
+
+    def test_start_is_refused_until_a_session_finishes(self):
+        admission = Admission(rate=0, sessions_per_client=3)
+        for _ in range(100):
+            self.assertTrue(admission.admit(scope("/choose")))
+        for key in range(3):
+            self.assertTrue(admission.admit(scope("/start")))
+            admission.started(scope("/start"), key)
+        self.assertFalse(admission.admit(scope("/start")))
+        self.assertTrue(admission.admit(scope("/start", "10.0.0.2")))
+        admission.answered(0, done=False)
+        self.assertFalse(admission.admit(scope("/start")))
+        admission.answered(0, done=True)
+        self.assertTrue(admission.admit(scope("/start")))
+
+def refused_headers(admission, path):
+    """Headers of the 429 AdmissionMiddleware sends for ``path``."""
+    sent = []
+
+    async def app(scope, receive, send):
+        raise AssertionError("request should have been refused")
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(AdmissionMiddleware(app, admission)(scope(path), None, send))
+    assert sent[0]["status"] == 429
+    return dict(sent[0]["headers"])
+
+class Refusals(unittest.TestCase):
+    def test_rate_limited_asks_to_retry_in_a_second(self):
+        admission = Admission(rate=1, burst=1, sessions_per_client=0)
+        admission.admit(scope("/choose"))
+        self.assertEqual(refused_headers(admission, "/choose").get(b"retry-after"), b"1")
+        self.assertEqual(admission.counters["rate_limited"], 1)
+
+    def test_session_limited_has_no_retry_after(self):
+        admission = Admission(rate=0, sessions_per_client=1)
+        admission.admit(scope("/start"))
+        admission.started(scope("/start"), 0)
+        self.assertNotIn(b"retry-after", refused_headers(admission, "/start"))
+        self.assertEqual(admission.counters["session_limited"], 1)
+
+def post(chunks, headers=()):
+    """Run ``chunks`` through a 16-byte BodyLimitMiddleware in front of an
+    app that echoes the messages it receives; returns (limit, app messages,
+    sent messages, chunks read)."""
+    limit = BodyLimit(16)
+    seen, sent, read = [], [], []
+
+    async def app(scope, receive, send):
+        while True:
+            message = await receive()
+            seen.append(message)
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def receive():
+        chunk, more = chunks[len(read)]
+        read.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": more}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/choose", "headers": list(headers)}
+    asyncio.run(BodyLimitMiddleware(app, limit)(scope, receive, send))
+    return limit, seen, sent, read
+
+class BodyLimits(unittest.TestCase):
+    def test_declared_too_large_is_refused_unread(self):
+        limit, seen, sent, read = post([(b"x" * 17, False)], [(b"content-length", b"17")])
+        self.assertEqual((seen, read), ([], []))
+        self.assertEqual(sent[0]["status"], 413)
+        self.assertEqual(limit.counters["declared_too_large"], 1)
+
+    def test_streamed_too_large_stops_reading(self):
+        chunks = [(b"x" * 10, True), (b"x" * 10, True), (b"x" * 10, False)]
+        limit, seen, sent, read = post(chunks)
+        self.assertEqual((seen, len(read)), ([], 2))
+        self.assertEqual(sent[0]["status"], 413)
+        self.assertEqual(limit.counters["streamed_too_large"], 1)
+
+    def test_body_is_replayed_whole(self):
+        chunks = [(b'{"answer":', True), (b'"yes"}', False)]
+        limit, seen, sent, _ = post(chunks, [(b"content-length", b"16")])
+        self.assertEqual(seen, [{"type": "http.request", "body": b'{"answer":"yes"}', "more_body": False}])
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(limit.counters, {"declared_too_large": 0, "streamed_too_large": 0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Same-session requests hammered from many threads and processes.
+
+Each step runs the ``/choose`` critical section (load, advance, save)
+under the session's stripe lock. The answer depends only on the session's
+state, so if no update is lost, the result must equal a serial run of as
+many steps.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+
+import engine
+from sessions import LockStripes, SharedMemorySessionStore, SQLiteSessionStore, fcntl
+
+SID = "00000000-0000-4000-8000-000000000001"
+
+def answer(st):
+    return "no" if (st.cursor + len(st.revealed)) % 3 == 0 else "yes"
+
+def advance(st):
+    a = answer(st)
+    before = st.to_bytes(with_reply=False)
+    engine.advance(st, a)
+    st.remember_reply(st.last_seq + 1, engine.ANSWER_CLASSES[a], before)
+
+def step(store, locks):
+    with locks(SID):
+        st = store.get(SID)
+        advance(st)
+        store.put(SID, st)
+
+def hammer(store, locks, steps, threads):
+    workers = [
+        threading.Thread(target=lambda: [step(store, locks) for _ in range(steps)]) for _ in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+def worker(make_store, path, steps):
+    store = make_store(path)
+    hammer(store, LockStripes(path=store.lock_path), steps, 2)
+
+def serial(steps):
+    st = engine.new_session(SID, seed=7)
+    for _ in range(steps):
+        advance(st)
+    return st
+
+class SameSessionStress(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def check(self, store, steps):
+        st = store.get(SID)
+        self.assertEqual(st.last_seq, steps)
+        self.assertEqual(len(set(st.revealed)), len(st.revealed))
+        self.assertEqual(st.to_bytes(), serial(steps).to_bytes())
+
+    def test_threads(self):
+        store = SQLiteSessionStore(os.path.join(self.dir, "sessions.db"))
+        store.put(SID, engine.new_session(SID, seed=7))
+        hammer(store, LockStripes(), 50, 8)
+        self.check(store, 400)
+
+    @unittest.skipIf(fcntl is None, "needs POSIX file locks")
+    def test_processes(self):
+        for make_store, name in ((SQLiteSessionStore, "sessions.db"), (SharedMemorySessionStore, "shm")):
+            with self.subTest(store=make_store.__name__):
+                path = os.path.join(self.dir, name)
+                store = make_store(path)
+                store.put(SID, engine.new_session(SID, seed=7))
+                ctx = multiprocessing.get_context("fork")
+                procs = [ctx.Process(target=worker, args=(make_store, path, 40)) for _ in range(3)]
+                for p in procs:
+                    p.start()
+                for p in procs:
+                    p.join()
+                    self.assertEqual(p.exitcode, 0)
+                self.check(store, 3 * 2 * 40)
+
+if __name__ == "__main__":
+    unittest.main()
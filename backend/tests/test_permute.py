@@ -0,0 +1,24 @@
+import unittest
+
+from sessions import permute
+
+class Permute(unittest.TestCase):
+    def test_bijection(self):
+        sizes = [1, 2, 3, 5, 50_000]
+        for bits in (2, 3, 4, 8, 12):
+            sizes += [2**bits - 1, 2**bits, 2**bits + 1]
+        for n in sizes:
+            for seed in (0, 0xFFFFFFFF):
+                order = [permute(k, n, seed) for k in range(n)]
+                self.assertEqual(sorted(order), list(range(n)), (n, seed))
+
+    def test_seeds_differ(self):
+        self.assertNotEqual([permute(k, 100, 1) for k in range(100)], [permute(k, 100, 2) for k in range(100)])
+
+    def test_out_of_range(self):
+        for k, n in ((0, 0), (0, -1), (5, 5), (-1, 5)):
+            with self.assertRaises(IndexError):
+                permute(k, n, 7)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import random
+import unittest
+
+import engine
+from sessions import EventSourcedSessionStore, Session
+
+def answer(st, seq, a):
+    """What ``app.run_choice`` does with a numbered answer."""
+    if st.is_repeat(seq):
+        return engine.repeat_reply(st)
+    before = st.to_bytes(with_reply=False)
+    out = engine.advance(st, a)
+    st.remember_reply(seq, engine.ANSWER_CLASSES.get(a, engine.OTHER), before)
+    return out
+
+class RepeatedAnswers(unittest.TestCase):
+    def test_retry_and_late_requests_do_not_advance(self):
+        st = engine.new_session("s", seed=3)
+        answer(st, 1, "yes")
+        reveal = answer(st, 2, "yes")
+        state = st.to_bytes()
+        for seq in (2, 1):
+            self.assertEqual(answer(st, seq, "no"), reveal)
+            self.assertEqual(st.to_bytes(), state)
+        self.assertNotEqual(answer(st, 3, "no"), reveal)
+
+    def test_repeat_survives_the_record(self):
+        st = engine.new_session("s", seed=4)
+        for seq, a in enumerate(("yes", "no", "yes", "yes"), 1):
+            out = answer(st, seq, a)
+        copy = Session.from_bytes("s", st.to_bytes())
+        self.assertEqual(engine.repeat_reply(copy), out)
+        self.assertLess(len(st.to_bytes()), len(out.text))
+
+    def test_replayed_session_repeats_its_last_answer(self):
+        st = engine.new_session("s", seed=5, history=True)
+        for seq, a in enumerate(("yes", "yes", "huh", "yes"), 1):
+            out = answer(st, seq, a)
+        rebuilt = engine.replay("s", st.events())
+        self.assertEqual(rebuilt.to_bytes(), st.to_bytes())
+        self.assertEqual(engine.repeat_reply(rebuilt), out)
+
+    def test_replay_matches_mixed_numbered_answers(self):
+        rng = random.Random(11)
+        for seed in range(2000):
+            st = engine.new_session("s", seed=seed, history=True)
+            seq = 0
+            for _ in range(rng.randrange(1, 12)):
+                numbered = rng.random() < 0.6
+                seq += numbered
+                answer(st, seq if numbered else None, rng.choice(("yes", "yes", "no", "huh")))
+            rebuilt = engine.replay("s", st.events())
+            self.assertEqual(rebuilt.to_bytes(), st.to_bytes(), seed)
+
+class EventSourcedStore(unittest.TestCase):
+    def setUp(self):
+        self.store = EventSourcedSessionStore(engine.replay, hot_sessions=1)
+        self.old = engine.new_session("a", seed=7, history=True)
+        engine.advance(self.old, "yes")
+        self.store.put("a", self.old)
+        self.new = engine.replay("a", self.old.events())
+        engine.advance(self.new, "yes")
+
+    def get_while(self, during):
+        """``store.get("a")`` with ``during()`` run mid-replay."""
+        replay = self.store.replay
+
+        def slow(sid, events):
+            st = replay(sid, events)
+            during()
+            return st
+
+        self.store.replay = slow
+        try:
+            return self.store.get("a")
+        finally:
+            self.store.replay = replay
+
+    def cool(self):
+        self.store.put("b", engine.new_session("b", history=True))
+
+    def test_put_during_replay_stays_hot(self):
+        self.cool()
+        got = self.get_while(lambda: self.store.put("a", self.new))
+        self.assertIs(got, self.new)
+        self.assertIs(self.store.get("a"), self.new)
+
+    def test_stale_replay_is_not_warmed(self):
+        self.cool()
+
+        def put_and_cool():
+            self.store.put("a", self.new)
+            self.cool()
+
+        self.get_while(put_and_cool)
+        self.assertEqual(self.store.get("a").to_bytes(), self.new.to_bytes())
+
+if __name__ == "__main__":
+    unittest.main()
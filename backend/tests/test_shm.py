@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+import unittest
+import uuid
+
+import engine
+from sessions import SharedMemorySessionStore, fcntl
+
+def grown(sid, words):
+    """A session that has been shown ``words`` words, as on a very large deck."""
+    st = engine.new_session(sid, seed=11)
+    st.revealed.extend(range(words))
+    return st
+
+@unittest.skipIf(fcntl is None, "needs POSIX file locks")
+class Spill(unittest.TestCase):
+    """Records that outgrow a slot live in a spill file, not a 500."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "shm")
+        self.store = self.open()
+
+    def open(self, **kw):
+        kw = {"max_sessions": 2, "ways": 2, "slot_size": 256, **kw}
+        return SharedMemorySessionStore(self.path, **kw)
+
+    def spills(self):
+        return os.listdir(self.store.spill_path)
+
+    def put_big(self, sid=None):
+        sid = sid or str(uuid.uuid4())
+        st = grown(sid, 100)
+        self.assertGreater(len(st.to_bytes(with_reply=False)), 256)
+        self.store.put(sid, st)
+        return sid, st
+
+    def test_round_trip(self):
+        sid, st = self.put_big()
+        self.assertEqual(self.store.get(sid).to_bytes(), st.to_bytes())
+        self.assertEqual(self.open().get(sid).to_bytes(), st.to_bytes())
+        self.assertEqual(list(self.store), [sid])
+        self.assertEqual(self.store.stats()["spilled"], 1)
+        self.assertEqual(len(self.spills()), 1)
+
+    def test_delete(self):
+        sid, _ = self.put_big()
+        self.store.delete(sid)
+        self.assertIsNone(self.store.get(sid))
+        self.assertEqual(self.spills(), [])
+
+    def test_shrink(self):
+        sid, _ = self.put_big()
+        small = engine.new_session(sid, seed=1)
+        self.store.put(sid, small)
+        self.assertEqual(self.store.get(sid).to_bytes(), small.to_bytes())
+        self.assertEqual(self.spills(), [])
+
+    def test_eviction(self):
+        sid, _ = self.put_big()
+        for _ in range(2):
+            other = str(uuid.uuid4())
+            self.store.put(other, engine.new_session(other, seed=1))
+        self.assertIsNone(self.store.get(sid))
+        self.assertEqual(self.spills(), [])
+
+    def test_expiry(self):
+        self.store = self.open(ttl_seconds=0.05)
+        sid, _ = self.put_big()
+        time.sleep(0.1)
+        self.assertIsNone(self.store.get(sid))
+        self.assertEqual(self.spills(), [])
+
+    def test_reinitialized_table_drops_spills(self):
+        self.put_big()
+        self.store = self.open(slot_size=512)
+        self.assertEqual(self.spills(), [])